@@ -0,0 +1,56 @@
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, Any
+
+from utils.db import MongoDB
+from utils.openai_client import OpenAIClient
+from utils.batch import BatchProcessor
+
+
+def build_query(args: argparse.Namespace) -> Dict[str, Any]:
+    """Build a captures query from command line filters."""
+    query: Dict[str, Any] = {}
+    if args.archived != 'all':
+        query['archived'] = args.archived == 'true'
+
+    timestamp: Dict[str, datetime] = {}
+    if args.since:
+        timestamp['$gte'] = datetime.fromisoformat(args.since)
+    if args.until:
+        timestamp['$lt'] = datetime.fromisoformat(args.until)
+    if timestamp:
+        query['timestamp'] = timestamp
+    return query
+
+
+def main() -> None:
+    """Analyze stored captures offline through the OpenAI Batch API."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('message', help="Prompt sent with every group of captures")
+    parser.add_argument('--archived', choices=['true', 'false', 'all'], default='true',
+                        help="Which captures to include (default: archived only)")
+    parser.add_argument('--since', help="Only captures at or after this ISO timestamp")
+    parser.add_argument('--until', help="Only captures before this ISO timestamp")
+    parser.add_argument('--group-size', type=int, default=1,
+                        help="Number of captures sent per request (default: 1)")
+    parser.add_argument('--poll-interval', type=float, default=30.0,
+                        help="Seconds between batch status checks (default: 30)")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Give up waiting after this many seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    processor = BatchProcessor(MongoDB(), OpenAIClient())
+    saved = processor.run(build_query(args), args.message, args.group_size,
+                          args.poll_interval, args.timeout)
+    logging.info(f"Batch processing finished, {saved} responses saved")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import logging
+import sys
+from datetime import datetime
+
+from utils.db import MongoDB
+from utils.archive import import_archive
+
+
+def main() -> None:
+    """Import captures and responses from an archive produced by /export."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('archive', help="Path to the tar archive, or - to read from stdin")
+    parser.add_argument('--since', help="Only documents at or after this ISO timestamp")
+    parser.add_argument('--until', help="Only documents before this ISO timestamp")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+
+    db = MongoDB()
+    if args.archive == '-':
+        import_archive(db, sys.stdin.buffer, since, until)
+    else:
+        with open(args.archive, 'rb') as f:
+            import_archive(db, f, since, until)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import json
+import logging
+
+from utils.db import MongoDB
+from utils.openai_client import OpenAIClient
+from utils.video import VideoIngestor, VIDEO_MODES
+
+
+def main() -> None:
+    """Sample frames from a video file or stream URL into linked captures."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('source', help="Path to a video file or a stream URL")
+    parser.add_argument('--mode', choices=VIDEO_MODES, default='interval', help="Frame sampling mode")
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="Seconds between frames in interval mode")
+    parser.add_argument('--scene-threshold', type=float, default=0.15,
+                        help="Minimum frame difference (0-1) for a scene change")
+    parser.add_argument('--max-frames', type=int, default=50, help="Maximum frames to keep")
+    parser.add_argument('--max-seconds', type=float, help="Stop after this many seconds of video")
+    parser.add_argument('--message', help="Send a subset of the frames to the model with this prompt")
+    parser.add_argument('--send-limit', type=int, default=5, help="Frames sent with --message")
+    parser.add_argument('--model', help="Model alias or name for --message")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    ingestor = VideoIngestor(MongoDB(), OpenAIClient() if args.message else None)
+    result = ingestor.ingest(
+        args.source,
+        mode=args.mode,
+        interval_seconds=args.interval,
+        scene_threshold=args.scene_threshold,
+        max_frames=args.max_frames,
+        max_seconds=args.max_seconds,
+        message=args.message,
+        send_limit=args.send_limit,
+        model=args.model
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
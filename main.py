@@ -1,9 +1,13 @@
+import os
 import logging
 from dataclasses import dataclass
 from pathlib import Path
 
 from flask import Flask
 from utils.openai_client import OpenAIClient
+from utils.db import MongoDB
+from utils.migrations import run_migrations, start_background_migrations
+from utils.log_setup import setup_logging, init_request_logging
 from routes.lander import Lander, lander
 from routes.special_routes import SpecialRoutes, special_routes
 from routes.dashboard import Dashboard, dashboard
@@ -13,16 +17,26 @@ class Config:
     """Application configuration."""
     PORT: int = 5001
     LOG_FILE: Path = Path("./server_debug.log")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # "text" or "json" (JSON lines)
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    LOG_ROTATE_HOURS: float = float(os.getenv("LOG_ROTATE_HOURS", "24"))
 
 def create_app(config: Config) -> Flask:
     """Create and configure Flask application."""
     app = Flask(__name__)
+    init_request_logging(app)
+
+    # Bring stored documents up to the current schema; slow backfills continue after startup
+    db = MongoDB()
+    run_migrations(db)
+    start_background_migrations(db)
     
     # Initialize clients and route handlers
     openai_client = OpenAIClient()
     lander_routes = Lander()
     special_routes_handler = SpecialRoutes(config, openai_client)
-    dashboard_routes = Dashboard(config)
+    dashboard_routes = Dashboard(config, openai_client)
 
     # Register routes
     lander_routes.register_routes()
@@ -41,16 +55,9 @@ def main() -> None:
     # Initialize configuration
     config = Config()
 
-    # Setup logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            logging.FileHandler(str(config.LOG_FILE)),
-            logging.StreamHandler()  # Add console output
-        ]
-    )
+    # Setup logging (queued, rotating, optionally JSON lines). The debug reloader
+    # runs this module in a parent and a serving child; only the child writes the log file.
+    setup_logging(config, log_to_file=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
 
     # Create and run app
     app = create_app(config)
@@ -1,11 +1,14 @@
-from flask import Blueprint, render_template, jsonify, Response, current_app
+from flask import Blueprint, render_template, jsonify, Response, current_app, request
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import inspect
-import os
 import logging
 
 from utils.db import MongoDB
+from utils.openai_client import OpenAIClient
+from utils.events import on_write
+from utils.stats_cache import StatsCache
+from utils.log_setup import tail_log_lines
 from routes.special_routes import SpecialRoutes
 
 dashboard = Blueprint('dashboard', __name__,
@@ -13,10 +16,19 @@ dashboard = Blueprint('dashboard', __name__,
                      static_folder='static')
 
 class Dashboard:
-    def __init__(self, config: Any):
+    def __init__(self, config: Any, openai_client: Optional[OpenAIClient] = None):
         self.config = config
+        self.openai_client = openai_client
         self.db = MongoDB()
 
+        # One background refresher serves every dashboard client
+        self.stats_cache = StatsCache({
+            'stats': self._compute_stats,
+            'mongodb': self._compute_mongodb_counts
+        })
+        on_write(self.stats_cache.mark_dirty)
+        self.stats_cache.start()
+
     def register_routes(self) -> None:
         """Register all dashboard routes."""
         dashboard.add_url_rule('/dashboard', 'dashboard',
@@ -37,68 +49,73 @@ class Dashboard:
     def get_stats(self) -> Response:
         """Get system statistics."""
         try:
-            now = datetime.now()
-            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # Get capture statistics
-            total_captures = self.db.captures.count_documents({})
-            today_captures = self.db.captures.count_documents({
-                'timestamp': {'$gte': today}
-            })
-            
-            # Get response statistics
-            total_responses = self.db.responses.count_documents({})
-            today_responses = self.db.responses.count_documents({
-                'timestamp': {'$gte': today}
-            })
-            
-            # Get hourly statistics for the last 24 hours
-            hourly_stats = []
-            for i in range(24):
-                hour_start = now - timedelta(hours=i+1)
-                hour_end = now - timedelta(hours=i)
-                captures = self.db.captures.count_documents({
-                    'timestamp': {
-                        '$gte': hour_start,
-                        '$lt': hour_end
-                    }
-                })
-                responses = self.db.responses.count_documents({
-                    'timestamp': {
-                        '$gte': hour_start,
-                        '$lt': hour_end
-                    }
-                })
-                hourly_stats.append({
-                    'hour': hour_start.strftime('%H:00'),
-                    'captures': captures,
-                    'responses': responses
-                })
-            
-            # Get storage statistics
-            captures_size = sum(doc.get('image_data', '').__sizeof__() 
-                              for doc in self.db.captures.find({}, {'image_data': 1}))
-            responses_size = sum(doc.get('response_data', {}).__sizeof__() 
-                               for doc in self.db.responses.find({}, {'response_data': 1}))
-            
-            return jsonify({
-                'total_stats': {
-                    'captures': total_captures,
-                    'responses': total_responses,
-                    'today_captures': today_captures,
-                    'today_responses': today_responses,
-                    'storage_usage': {
-                        'captures': captures_size,
-                        'responses': responses_size,
-                        'total': captures_size + responses_size
-                    }
-                },
-                'hourly_stats': hourly_stats
-            })
-            
+            force = request.args.get('refresh') in ('1', 'true')
+            return jsonify(self.stats_cache.get('stats', force=force))
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    def _compute_stats(self) -> Dict[str, Any]:
+        """Compute capture and response statistics."""
+        now = datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # Get capture and response statistics
+        total_captures = self.db.captures.estimated_document_count()
+        today_captures = self.db.captures.count_documents({
+            'timestamp': {'$gte': today}
+        })
+        total_responses = self.db.responses.estimated_document_count()
+        today_responses = self.db.responses.count_documents({
+            'timestamp': {'$gte': today}
+        })
+
+        # Get hourly statistics for the last 24 hours, one aggregation per collection
+        capture_hours = self._hourly_counts(self.db.captures, now)
+        response_hours = self._hourly_counts(self.db.responses, now)
+        hourly_stats = []
+        for i in range(24):
+            hour_start = now - timedelta(hours=i+1)
+            hourly_stats.append({
+                'hour': hour_start.strftime('%H:00'),
+                'captures': capture_hours.get(i, 0),
+                'responses': response_hours.get(i, 0)
+            })
+
+        # Get storage statistics from collection metadata
+        captures_size = self._collection_size(self.db.captures)
+        responses_size = self._collection_size(self.db.responses)
+
+        return {
+            'total_stats': {
+                'captures': total_captures,
+                'responses': total_responses,
+                'today_captures': today_captures,
+                'today_responses': today_responses,
+                'storage_usage': {
+                    'captures': captures_size,
+                    'responses': responses_size,
+                    'total': captures_size + responses_size
+                }
+            },
+            'hourly_stats': hourly_stats
+        }
+
+    def _hourly_counts(self, collection: Any, now: datetime) -> Dict[int, int]:
+        """Count documents per hour for the last 24 hours, keyed by hours ago."""
+        results = collection.aggregate([
+            {'$match': {'timestamp': {'$gte': now - timedelta(hours=24), '$lt': now}}},
+            {'$group': {
+                '_id': {'$floor': {'$divide': [{'$subtract': [now, '$timestamp']}, 3600 * 1000]}},
+                'count': {'$sum': 1}
+            }}
+        ])
+        return {int(result['_id']): result['count'] for result in results}
+
+    def _collection_size(self, collection: Any) -> int:
+        """Uncompressed data size of a collection."""
+        stats = next(collection.aggregate([{'$collStats': {'storageStats': {}}}]), {})
+        return stats.get('storageStats', {}).get('size', 0)
+
     def get_routes(self) -> Response:
         """Get information about available routes."""
         try:
@@ -146,23 +163,7 @@ class Dashboard:
     def get_system_info(self) -> Response:
         """Get system information."""
         try:
-            # Get MongoDB statistics
-            # Recent captures are those that are not archived
-            recent_captures = self.db.captures.count_documents({
-                '$or': [
-                    {'archived': False},
-                    {'archived': {'$exists': False}}  # Include documents where archived field doesn't exist
-                ]
-            })
-            
-            # Archived captures have archived=True
-            archived_captures = self.db.captures.count_documents({
-                'archived': True
-            })
-            
-            # Count all responses
-            recent_responses = self.db.responses.count_documents({})
-
+            force = request.args.get('refresh') in ('1', 'true')
             return jsonify({
                 'folders': {
                     'logs': str(self.config.LOG_FILE)
@@ -174,52 +175,29 @@ class Dashboard:
                     'port': self.config.PORT,
                     'debug': True
                 },
-                'mongodb': {
-                    'recent_captures': recent_captures,
-                    'archived_captures': archived_captures,
-                    'recent_responses': recent_responses
-                }
+                'mongodb': self.stats_cache.get('mongodb', force=force),
+                'openai': self.openai_client.get_metrics() if self.openai_client else {}
             })
             
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    def _compute_mongodb_counts(self) -> Dict[str, Any]:
+        """Count recent and archived captures and all responses."""
+        return {
+            # Recent captures are those that are not archived
+            'recent_captures': self.db.captures.count_documents({'archived': False}),
+            'archived_captures': self.db.captures.count_documents({'archived': True}),
+            'recent_responses': self.db.responses.estimated_document_count()
+        }
+
     def get_logs(self) -> Response:
         """Get the last 1000 lines of server logs."""
         try:
-            if not os.path.exists(self.config.LOG_FILE):
+            lines = tail_log_lines(self.config.LOG_FILE, limit=1000)
+            if lines is None:
                 return "No logs available", 404
-
-            # Read the last 1000 lines of the log file
-            with open(self.config.LOG_FILE, 'r') as f:
-                # Move to end of file and get position
-                f.seek(0, 2)
-                file_size = f.tell()
-                
-                # Start from end and read chunks until we have 1000 lines or reach start
-                lines = []
-                chunk_size = 4096
-                position = file_size
-                
-                while len(lines) < 1000 and position > 0:
-                    # Move back one chunk or to start of file
-                    chunk_pos = max(position - chunk_size, 0)
-                    f.seek(chunk_pos)
-                    
-                    # Read chunk
-                    chunk = f.read(position - chunk_pos)
-                    
-                    # Count lines in chunk
-                    lines = chunk.splitlines() + lines
-                    position = chunk_pos
-                    
-                    # If at start of file, break
-                    if chunk_pos == 0:
-                        break
-                
-                # Take last 1000 lines
-                logs = '\n'.join(lines[-1000:])
-                return logs
+            return '\n'.join(lines)
 
         except Exception as e:
-            return str(e), 500 
\ No newline at end of file
+            return str(e), 500
@@ -1,30 +1,57 @@
-from flask import Blueprint, jsonify, Response, request, send_file, current_app
+from flask import Blueprint, jsonify, Response, request, send_file, current_app, stream_with_context
 import logging
 import base64
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import cv2
 import numpy as np
 from PIL import Image
 import io
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-import os
 import json
+import os
+import tempfile
+from urllib.parse import urlparse
 from bson import ObjectId
 
 from utils.openai_client import OpenAIClient
-from utils.db import MongoDB
+from utils.resilience import CircuitOpenError, OverloadedError
+from utils.rate_limit import RateLimiter
+from utils.db import MongoDB, CAPTURE_LIST_PROJECTION, capture_mimetype
+from utils.sampling import STRATEGIES
+from utils.conversation import CaptureDescriber, ContextBuilder, new_conversation_id
+from utils.search import ResponseSearch
+from utils.archive import export_archive
+from utils.log_setup import stage, tail_log_lines
+from utils.thumbnails import ThumbnailGenerator, VARIANTS, make_variant
+from utils.video import VideoIngestor, VIDEO_MODES
 from config import Config
 
 special_routes = Blueprint('special_routes', __name__)
-db = MongoDB()
-openai_client = OpenAIClient()
+
+# Request body fields that choose which captures are sent to OpenAI
+SELECTION_FIELDS = ('capture_ids', 'since', 'until', 'last_minutes', 'source',
+                    'include_archived', 'sampling', 'limit')
+DEFAULT_CAPTURE_LIMIT = 5
+MAX_CAPTURE_LIMIT = 50
+MAX_BATCH_PROMPTS = int(os.getenv("MAX_BATCH_PROMPTS", "20"))
+# Upper bound on frames kept from one video, which also bounds the bulk insert
+MAX_VIDEO_FRAMES = 200
+VIDEO_URL_SCHEMES = ('http', 'https', 'rtsp', 'rtmp')
+
 
 class SpecialRoutes:
     def __init__(self, config: Any, openai_client: OpenAIClient):
         self.config = config
         self.openai_client = openai_client
         self.db = MongoDB()
+        self.thumbnails = ThumbnailGenerator(self.db)
+        self.context_builder = ContextBuilder(self.db)
+        self.describer = CaptureDescriber(self.db, openai_client)
+        self.search = ResponseSearch(self.db, openai_client)
+        self.search.start()
+        self.videos = VideoIngestor(self.db, openai_client, self.thumbnails)
+        self.rate_limiter = RateLimiter(self.db)
         # Initialize video capture device
         self.cap = None
         self.device_id = 0  # Default to first video device
@@ -32,17 +59,29 @@ class SpecialRoutes:
     def register_routes(self) -> None:
         """Register all routes with their handlers."""
         special_routes.add_url_rule('/capture', 'capture', 
-                                  view_func=self.capture, 
+                                  view_func=self.rate_limiter.limit('capture')(self.capture), 
                                   methods=['POST'])
         special_routes.add_url_rule('/send_request', 'send_request', 
-                                  view_func=self.send_request, 
+                                  view_func=self.rate_limiter.limit('send_request')(self.send_request), 
+                                  methods=['POST'])
+        special_routes.add_url_rule('/send_batch_request', 'send_batch_request',
+                                  view_func=self.rate_limiter.limit('send_batch_request')(self.send_batch_request),
                                   methods=['POST'])
         special_routes.add_url_rule('/recent_captures', 'recent_captures',
                                   view_func=self.get_recent_captures,
                                   methods=['GET'])
+        special_routes.add_url_rule('/capture_image/<capture_id>', 'capture_image',
+                                  view_func=self.get_capture_image,
+                                  methods=['GET'])
         special_routes.add_url_rule('/recent_responses', 'recent_responses',
                                   view_func=self.get_recent_responses,
                                   methods=['GET'])
+        special_routes.add_url_rule('/response_raw/<response_id>', 'response_raw',
+                                  view_func=self.get_raw_response,
+                                  methods=['GET'])
+        special_routes.add_url_rule('/search_responses', 'search_responses',
+                                  view_func=self.search_responses,
+                                  methods=['GET'])
         special_routes.add_url_rule('/archived_captures', 'archived_captures',
                                   view_func=self.get_archived_captures,
                                   methods=['GET'])
@@ -55,6 +94,15 @@ class SpecialRoutes:
         special_routes.add_url_rule('/delete_response', 'delete_response',
                                   view_func=self.delete_response,
                                   methods=['POST'])
+        special_routes.add_url_rule('/ingest_video', 'ingest_video',
+                                  view_func=self.rate_limiter.limit('ingest_video')(self.ingest_video),
+                                  methods=['POST'])
+        special_routes.add_url_rule('/ingest_video/<job_id>', 'ingest_video_status',
+                                  view_func=self.get_video_job,
+                                  methods=['GET'])
+        special_routes.add_url_rule('/export', 'export',
+                                  view_func=self.export,
+                                  methods=['GET'])
         special_routes.add_url_rule('/server_logs', 'server_logs',
                                   view_func=self.get_server_logs,
                                   methods=['GET'])
@@ -87,13 +135,16 @@ class SpecialRoutes:
             img_byte_arr = img_byte_arr.getvalue()
 
             # Save directly to database
-            capture_id = self.db.save_capture_data(img_byte_arr)
+            capture_id = self.db.save_capture_data(img_byte_arr, source=f"camera:{self.device_id}")
             if not capture_id:
                 return jsonify({
                     "status": "error",
                     "message": "Failed to save capture to database"
                 }), 500
 
+            # Thumbnail and preview are generated off the request thread
+            self.thumbnails.submit(capture_id, img_byte_arr)
+
             logging.info(f"Video frame captured and saved with ID: {capture_id}")
             return jsonify({
                 "status": "success",
@@ -120,47 +171,68 @@ class SpecialRoutes:
                 return jsonify({"error": "Missing 'message' in request body"}), 400
 
             message = data['message']
+            conversation_id = data.get('conversation_id')
+            is_follow_up = bool(conversation_id)
             logging.info(f"Processing send_request with message: {message}")
 
-            # Get recent captures from database
-            recent_captures = self.db.get_recent_captures(limit=5)  # Get last 5 captures
-            if not recent_captures:
-                return jsonify({"error": "No captures found"}), 400
+            model_error = self._check_model(data.get('model'))
+            if model_error:
+                return jsonify({"error": model_error}), 400
+
+            if is_follow_up and not self.db.get_conversation_turns(conversation_id, limit=1):
+                return jsonify({"error": f"Conversation '{conversation_id}' not found"}), 404
+
+            # Select captures from database (last 5 unarchived by default).
+            # Follow-ups only send new captures when the request asks for them.
+            try:
+                selection = self._parse_selection(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            if is_follow_up and not any(field in data for field in SELECTION_FIELDS):
+                selected_captures = []
+            else:
+                with stage('select_captures'):
+                    selected_captures = self.db.select_captures(**selection)
+                if not selected_captures:
+                    return jsonify({"error": "No captures found"}), 400
 
             # Process images
-            base64_images = []
-            capture_ids = []
-            for capture in recent_captures:
-                base64_images.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/png;base64,{capture['image_data']}"
-                    }
-                })
-                capture_ids.append(str(capture['_id']))
+            base64_images = self._build_images(selected_captures)
+            capture_ids = [str(capture['_id']) for capture in selected_captures]
+
+            # Earlier turns are replayed as text where capture descriptions are cached
+            with stage('build_context'):
+                history = self.context_builder.build(conversation_id) if is_follow_up else []
+            conversation_id = conversation_id or new_conversation_id()
 
             # Get OpenAI response
-            response = self.openai_client.process_request(message, base64_images)
-            
-            # Convert response to dict if it's not already
-            if hasattr(response, 'model_dump'):
-                response_dict = response.model_dump()
-            else:
-                response_dict = response
+            with stage('model_request'):
+                response = self.openai_client.process_request(message, base64_images, history,
+                                                              model=data.get('model'))
+            response_dict = self._response_to_dict(response)
 
-            logging.info(f"Received response from OpenAI: {response_dict}")
+            logging.info(f"Received response from OpenAI: {response_dict.get('id')} "
+                         f"({response_dict.get('usage', {}).get('total_tokens')} tokens)")
+            logging.debug(f"OpenAI response payload: {response_dict}")
 
             # Save response to database
-            response_id = self.db.save_response({
-                'message': message,
-                'response_data': response_dict,
-                'capture_ids': capture_ids,
-                'timestamp': datetime.now()
-            })
+            with stage('save_response'):
+                response_id = self.db.save_response({
+                    'message': message,
+                    'response_data': response_dict,
+                    'capture_ids': capture_ids,
+                    'conversation_id': conversation_id,
+                    'timestamp': datetime.now()
+                })
             
             if not response_id:
                 return jsonify({"error": "Failed to save response to database"}), 500
 
+            # Conversations that get follow-ups have their images described once, in the background
+            if is_follow_up:
+                self.describer.submit(conversation_id)
+
             # Archive all the captures that were sent to OpenAI
             for capture_id in capture_ids:
                 self.db.archive_capture(capture_id)
@@ -170,21 +242,202 @@ class SpecialRoutes:
             return jsonify({
                 "status": "success",
                 "response": response_dict,
-                "response_id": response_id
+                "response_id": response_id,
+                "conversation_id": conversation_id
             }), 200
 
+        except CircuitOpenError as e:
+            logging.warning(f"Rejected send_request: {e}")
+            return jsonify({"error": str(e)}), 503, {'Retry-After': str(int(e.retry_after) + 1)}
+        except OverloadedError as e:
+            logging.warning(f"Rejected send_request: {e}")
+            return jsonify({"error": str(e)}), 429, {'Retry-After': str(int(e.retry_after) + 1)}
         except Exception as e:
             logging.error(f"Error processing send_request: {e}")
             return jsonify({"error": str(e)}), 500
 
+    def send_batch_request(self) -> Response:
+        """Send several prompts to OpenAI concurrently."""
+        try:
+            data = request.json
+            if not data or not (data.get('messages') or data.get('requests')):
+                return jsonify({"error": "Missing 'messages' or 'requests' in request body"}), 400
+
+            # Normalize both body shapes into prompt/capture-set pairs
+            jobs = data.get('requests') or data['messages']
+            if not isinstance(jobs, list):
+                return jsonify({"error": "'messages' and 'requests' must be lists"}), 400
+            if len(jobs) > MAX_BATCH_PROMPTS:
+                return jsonify({"error": f"At most {MAX_BATCH_PROMPTS} prompts per batch"}), 400
+            if not data.get('requests'):
+                jobs = [{'message': message} for message in jobs]
+            if any(not isinstance(job, dict) or not isinstance(job.get('message'), str)
+                   or not job['message'].strip() for job in jobs):
+                return jsonify({"error": "Every request needs a non-empty 'message' string"}), 400
+            for model in [data.get('model')] + [job.get('model') for job in jobs]:
+                model_error = self._check_model(model)
+                if model_error:
+                    return jsonify({"error": model_error}), 400
+
+            logging.info(f"Processing send_batch_request with {len(jobs)} prompts")
+
+            # Jobs inherit the top-level capture selection unless they override it
+            defaults = {field: data[field] for field in SELECTION_FIELDS if field in data}
+            keys = [json.dumps({**defaults, **{field: job[field] for field in SELECTION_FIELDS if field in job}},
+                               sort_keys=True) for job in jobs]
+
+            # Fetch each distinct capture set once and share the encoded images
+            capture_sets: Dict[str, List[Dict[str, Any]]] = {}
+            for key in keys:
+                if key in capture_sets:
+                    continue
+                try:
+                    selection = self._parse_selection(json.loads(key))
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                capture_sets[key] = self.db.select_captures(**selection)
+                if not capture_sets[key]:
+                    return jsonify({"error": "No captures found"}), 400
+
+            images = {key: self._build_images(captures) for key, captures in capture_sets.items()}
+            pairs = [(job['message'], images[key], job.get('model') or data.get('model'))
+                     for job, key in zip(jobs, keys)]
+
+            # Get OpenAI responses
+            results = self.openai_client.process_requests(pairs)
+
+            # Nothing got through: answer like send_request so clients back off
+            if all(isinstance(result, (OverloadedError, CircuitOpenError)) for result in results):
+                retry_after = str(int(max(result.retry_after for result in results)) + 1)
+                status = 429 if any(isinstance(result, OverloadedError) for result in results) else 503
+                logging.warning(f"Rejected send_batch_request: {results[0]}")
+                return jsonify({"error": str(results[0])}), status, {'Retry-After': retry_after}
+
+            # Save every successful answer in one bulk write
+            now = datetime.now()
+            to_save = []
+            for job, key, result in zip(jobs, keys, results):
+                if isinstance(result, Exception):
+                    continue
+                to_save.append({
+                    'message': job['message'],
+                    'response_data': self._response_to_dict(result),
+                    'capture_ids': [str(capture['_id']) for capture in capture_sets[key]],
+                    'timestamp': now
+                })
+            response_ids = self.db.save_responses(to_save)
+            if to_save and not response_ids:
+                return jsonify({"error": "Failed to save responses to database"}), 500
+
+            # Archive all the captures that were sent to OpenAI
+            sent_ids = {capture_id for doc in to_save for capture_id in doc['capture_ids']}
+            if sent_ids:
+                archived = self.db.archive_captures(list(sent_ids))
+                logging.info(f"Archived {archived} captures after OpenAI batch request")
+
+            saved = iter(zip(to_save, response_ids))
+            batch_results = []
+            for job, result in zip(jobs, results):
+                if isinstance(result, Exception):
+                    batch_results.append({"message": job['message'], "error": str(result)})
+                else:
+                    doc, response_id = next(saved)
+                    batch_results.append({
+                        "message": job['message'],
+                        "response": doc['response_data'],
+                        "response_id": response_id
+                    })
+
+            logging.info(f"Saved {len(response_ids)} of {len(jobs)} batch responses to database")
+            return jsonify({
+                "status": "success",
+                "results": batch_results
+            }), 200
+
+        except Exception as e:
+            logging.error(f"Error processing send_batch_request: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    def _parse_selection(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn capture selection fields from a request body into select_captures arguments."""
+        try:
+            limit = int(data.get('limit', DEFAULT_CAPTURE_LIMIT))
+        except (TypeError, ValueError):
+            raise ValueError("'limit' must be an integer")
+        if not 1 <= limit <= MAX_CAPTURE_LIMIT:
+            raise ValueError(f"'limit' must be between 1 and {MAX_CAPTURE_LIMIT}")
+
+        capture_ids = data.get('capture_ids')
+        if capture_ids is not None and (not isinstance(capture_ids, list)
+                                        or not all(ObjectId.is_valid(id) for id in capture_ids)):
+            raise ValueError("'capture_ids' must be a list of capture IDs")
+        if capture_ids is not None and len(capture_ids) > MAX_CAPTURE_LIMIT:
+            raise ValueError(f"At most {MAX_CAPTURE_LIMIT} 'capture_ids' can be sent")
+
+        try:
+            since = datetime.fromisoformat(data['since']) if data.get('since') else None
+            until = datetime.fromisoformat(data['until']) if data.get('until') else None
+            if data.get('last_minutes'):
+                since = datetime.now() - timedelta(minutes=float(data['last_minutes']))
+        except (TypeError, ValueError):
+            raise ValueError("'since' and 'until' must be ISO timestamps and 'last_minutes' a number")
+
+        sampling = data.get('sampling') or {}
+        if not isinstance(sampling, dict):
+            raise ValueError("'sampling' must be an object with 'strategy' and optional 'n'")
+        strategy = sampling.get('strategy')
+        if strategy is not None and strategy not in STRATEGIES:
+            raise ValueError(f"'sampling.strategy' must be one of {', '.join(STRATEGIES)}")
+        try:
+            step = int(sampling.get('n', 1))
+        except (TypeError, ValueError):
+            raise ValueError("'sampling.n' must be an integer")
+        if step < 1:
+            raise ValueError("'sampling.n' must be at least 1")
+
+        return {
+            'capture_ids': capture_ids,
+            'since': since,
+            'until': until,
+            'source': data.get('source'),
+            'include_archived': bool(data.get('include_archived', False)),
+            'limit': limit,
+            'strategy': strategy,
+            'step': step
+        }
+
+    def _check_model(self, model: Any) -> Optional[str]:
+        """Return an error message if a requested model can't be used, else None."""
+        if model is None:
+            return None
+        if not isinstance(model, str) or not model:
+            return "'model' must be a non-empty string"
+        try:
+            self.openai_client.router.resolve('', model)
+        except ValueError as e:
+            return str(e)
+        return None
+
+    def _build_images(self, captures: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build OpenAI image_url content parts from capture documents."""
+        return [{
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{capture_mimetype(capture)};base64,{capture['image_data']}"
+            }
+        } for capture in captures]
+
+    def _response_to_dict(self, response: Any) -> Dict[str, Any]:
+        """Convert an OpenAI response to a dict if it's not already."""
+        if hasattr(response, 'model_dump'):
+            return response.model_dump()
+        return response
+
     def get_recent_captures(self) -> Response:
         """Get recent captures from database."""
         try:
-            captures = self.db.get_recent_captures()
-            # Convert ObjectId to string for JSON serialization
-            for capture in captures:
-                capture['_id'] = str(capture['_id'])
-            return jsonify(captures), 200
+            captures = self.db.get_recent_captures(projection=CAPTURE_LIST_PROJECTION)
+            return jsonify([self._format_capture(capture) for capture in captures]), 200
         except Exception as e:
             logging.error(f"Error getting recent captures: {e}")
             return jsonify({"error": str(e)}), 500
@@ -200,8 +453,13 @@ class SpecialRoutes:
                 formatted_response = {
                     '_id': str(response['_id']),
                     'timestamp': response['timestamp'],
-                    'response_data': response.get('response_data', {}),
-                    'capture_ids': [str(id) for id in response.get('capture_ids', [])]
+                    'message': response.get('message', ''),
+                    'content': response.get('content', ''),
+                    'finish_reason': response.get('finish_reason'),
+                    'model': response.get('model'),
+                    'usage': response.get('usage', {}),
+                    'capture_ids': [str(id) for id in response.get('capture_ids', [])],
+                    'conversation_id': response.get('conversation_id')
                 }
                 formatted_responses.append(formatted_response)
                 
@@ -212,18 +470,99 @@ class SpecialRoutes:
             logging.error(f"Error getting recent responses: {e}")
             return jsonify({"error": str(e)}), 500
 
+    def get_raw_response(self, response_id: str) -> Response:
+        """Get the full OpenAI payload stored with a response."""
+        try:
+            if not ObjectId.is_valid(response_id):
+                return jsonify({'error': 'Invalid response ID'}), 400
+            raw_response = self.db.get_raw_response(response_id)
+            if raw_response is None:
+                return jsonify({'error': 'Raw response not found'}), 404
+            return jsonify(raw_response), 200
+        except Exception as e:
+            logging.error(f"Error getting raw response: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def search_responses(self) -> Response:
+        """Search stored responses by keyword or meaning."""
+        try:
+            query = request.args.get('q', '').strip()
+            mode = request.args.get('mode', 'keyword')
+            if not query:
+                return jsonify({'error': "Missing 'q' query parameter"}), 400
+            if mode not in ('keyword', 'semantic'):
+                return jsonify({'error': "'mode' must be 'keyword' or 'semantic'"}), 400
+            try:
+                page = max(int(request.args.get('page', 1)), 1)
+                per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+            except ValueError:
+                return jsonify({'error': "'page' and 'per_page' must be integers"}), 400
+
+            if mode == 'keyword':
+                results = self.search.keyword(query, page, per_page)
+            else:
+                results = self.search.semantic(query, page, per_page)
+
+            logging.info(f"Search '{query}' ({mode}) returned {len(results['results'])} results")
+            return jsonify({'page': page, 'per_page': per_page, 'mode': mode, **results}), 200
+
+        except Exception as e:
+            logging.error(f"Error searching responses: {e}")
+            return jsonify({'error': str(e)}), 500
+
     def get_archived_captures(self) -> Response:
         """Get archived captures from the database."""
         try:
-            captures = self.db.get_archived_captures()
-            # Convert ObjectId to string for JSON serialization
-            for capture in captures:
-                capture['_id'] = str(capture['_id'])
-            return jsonify(captures), 200
+            captures = self.db.get_archived_captures(projection=CAPTURE_LIST_PROJECTION)
+            return jsonify([self._format_capture(capture) for capture in captures]), 200
         except Exception as e:
             logging.error(f"Error getting archived captures: {e}")
             return jsonify({"error": str(e)}), 500
 
+    def get_capture_image(self, capture_id: str) -> Response:
+        """Get a capture image at thumbnail, preview or full size."""
+        try:
+            size = request.args.get('size', 'full')
+            if size != 'full' and size not in VARIANTS:
+                return jsonify({'error': f"Invalid size '{size}'"}), 400
+            if not ObjectId.is_valid(capture_id):
+                return jsonify({'error': 'Invalid capture ID'}), 400
+
+            if size == 'full':
+                capture = self.db.get_capture(capture_id, {'image_data': 1, 'file_type': 1})
+                if not capture:
+                    return jsonify({'error': 'Capture not found'}), 404
+                image_data = base64.b64decode(capture['image_data'])
+                mimetype = capture_mimetype(capture)
+            else:
+                capture = self.db.get_capture(capture_id, {f'variants.{size}': 1})
+                if not capture:
+                    return jsonify({'error': 'Capture not found'}), 404
+                variant = capture.get('variants', {}).get(size)
+                if not variant:
+                    # Older captures or pending workers: build the variant now and keep it
+                    full = self.db.get_capture(capture_id, {'image_data': 1})
+                    variant = make_variant(base64.b64decode(full['image_data']), size)
+                    self.db.save_capture_variants(capture_id, {size: variant})
+                image_data = base64.b64decode(variant['data'])
+                mimetype = variant['mimetype']
+
+            # Capture images never change once stored
+            return send_file(io.BytesIO(image_data), mimetype=mimetype, max_age=86400)
+
+        except Exception as e:
+            logging.error(f"Error getting capture image: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def _format_capture(self, capture: Dict[str, Any]) -> Dict[str, Any]:
+        """Prepare a capture listing entry for JSON, with image URLs instead of image data."""
+        capture_id = str(capture['_id'])
+        capture['_id'] = capture_id
+        capture['thumbnail_url'] = f"/capture_image/{capture_id}?size=thumbnail"
+        capture['preview_url'] = f"/capture_image/{capture_id}?size=preview"
+        capture['image_url'] = f"/capture_image/{capture_id}"
+        return capture
+
     def move_image(self) -> Response:
         """Move an image between recent and archived sections."""
         try:
@@ -284,6 +623,7 @@ class SpecialRoutes:
 
             response_id = data['response_id']
             if self.db.delete_response(response_id):
+                self.search.remove(response_id)
                 return jsonify({'status': 'success'}), 200
             else:
                 return jsonify({'error': 'Response not found'}), 404
@@ -292,42 +632,92 @@ class SpecialRoutes:
             logging.error(f"Error deleting response: {e}")
             return jsonify({'error': str(e)}), 500
 
+    def ingest_video(self) -> Response:
+        """Queue an uploaded video file or a stream URL for frame sampling."""
+        data = request.form if request.files else (request.get_json(silent=True) or {})
+        try:
+            mode = data.get('mode', 'interval')
+            if mode not in VIDEO_MODES:
+                raise ValueError(f"'mode' must be one of {', '.join(VIDEO_MODES)}")
+            options = {
+                'mode': mode,
+                'interval_seconds': float(data.get('interval_seconds', 1.0)),
+                'scene_threshold': float(data.get('scene_threshold', 0.15)),
+                'max_frames': min(int(data.get('max_frames', 50)), MAX_VIDEO_FRAMES),
+                'max_seconds': float(data['max_seconds']) if data.get('max_seconds') else None,
+                'message': data.get('message'),
+                'send_limit': min(int(data.get('send_limit', DEFAULT_CAPTURE_LIMIT)), MAX_CAPTURE_LIMIT),
+                'model': data.get('model') or None
+            }
+            if options['interval_seconds'] <= 0 or options['max_frames'] < 1 or options['send_limit'] < 1:
+                raise ValueError("'interval_seconds', 'max_frames' and 'send_limit' must be positive")
+            model_error = self._check_model(options['model'])
+            if model_error:
+                raise ValueError(model_error)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            video = request.files.get('video')
+            if video:
+                # The upload is spooled to disk so OpenCV can seek it; the worker removes it
+                suffix = Path(video.filename or '').suffix or '.mp4'
+                fd, source = tempfile.mkstemp(prefix='ai_observer_video_', suffix=suffix)
+                os.close(fd)
+                video.save(source)
+                job_id = self.videos.submit(source, cleanup=True, name=video.filename, **options)
+            else:
+                url = data.get('url')
+                if not url or urlparse(url).scheme not in VIDEO_URL_SCHEMES:
+                    return jsonify({'error': f"Provide a 'video' file or a 'url' "
+                                             f"({', '.join(VIDEO_URL_SCHEMES)})"}), 400
+                job_id = self.videos.submit(url, name=url, **options)
+
+            logging.info(f"Queued video ingestion job {job_id} ({mode})")
+            return jsonify({
+                'status': 'queued',
+                'job_id': job_id,
+                'status_url': f"/ingest_video/{job_id}"
+            }), 202
+
+        except Exception as e:
+            logging.error(f"Error queueing video ingestion: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def get_video_job(self, job_id: str) -> Response:
+        """Report the progress of a video ingestion job."""
+        job = self.videos.get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job), 200
+
+    def export(self) -> Response:
+        """Stream captures and responses as a tar archive."""
+        try:
+            since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+            until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        except ValueError:
+            return jsonify({'error': "'since' and 'until' must be ISO timestamps"}), 400
+
+        include = request.args.get('include', 'captures,responses').split(',')
+        filename = f"ai_observer_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar"
+        logging.info(f"Starting export of {', '.join(include)} (since={since}, until={until})")
+
+        archive = export_archive(self.db, since, until,
+                                 include_captures='captures' in include,
+                                 include_responses='responses' in include)
+        return Response(stream_with_context(archive), mimetype='application/x-tar',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+
     def get_server_logs(self) -> Response:
         """Get the last 1000 lines of server logs."""
         try:
-            if not os.path.exists(self.config.LOG_FILE):
+            lines = tail_log_lines(self.config.LOG_FILE, limit=1000)
+            if lines is None:
                 return "No logs available", 404
 
-            # Read the last 1000 lines of the log file
-            with open(self.config.LOG_FILE, 'r') as f:
-                # Move to end of file and get position
-                f.seek(0, 2)
-                file_size = f.tell()
-                
-                # Start from end and read chunks until we have 1000 lines or reach start
-                lines = []
-                chunk_size = 4096
-                position = file_size
-                
-                while len(lines) < 1000 and position > 0:
-                    # Move back one chunk or to start of file
-                    chunk_pos = max(position - chunk_size, 0)
-                    f.seek(chunk_pos)
-                    
-                    # Read chunk
-                    chunk = f.read(position - chunk_pos)
-                    
-                    # Count lines in chunk
-                    lines = chunk.splitlines() + lines
-                    position = chunk_pos
-                    
-                    # If at start of file, break
-                    if chunk_pos == 0:
-                        break
-                
-                # Take last 1000 lines and reverse them for chronological order (newest first)
-                logs = '\n'.join(reversed(lines[-1000:]))
-                return logs
+            # Reverse for newest first
+            return '\n'.join(reversed(lines))
 
         except Exception as e:
-            return str(e), 500 
\ No newline at end of file
+            return str(e), 500
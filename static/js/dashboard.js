@@ -41,6 +41,7 @@ async function loadStats() {
                 <dt class="text-sm font-medium text-gray-400 truncate">Today's Responses</dt>
                 <dd class="mt-1 text-3xl font-semibold text-green-400">${total_stats.today_responses}</dd>
             </div>
+            <p class="col-span-full text-xs text-gray-500">Updated ${data.cache?.age_seconds ?? 0}s ago</p>
         `;
 
         // Update activity chart
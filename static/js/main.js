@@ -226,8 +226,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 imgWrapper.className = 'relative group';
                 
                 const img = document.createElement('img');
-                img.src = `data:image/png;base64,${capture.image_data}`;
+                img.src = capture.thumbnail_url;
                 img.alt = 'Screenshot';
+                img.loading = 'lazy';
+                img.title = 'Double-click to open full size';
+                img.addEventListener('dblclick', () => window.open(capture.image_url, '_blank'));
                 img.className = 'draggable-image w-full h-32 object-cover rounded-lg shadow-lg cursor-move';
                 img.draggable = true;
                 img.dataset.imageId = capture._id;
@@ -304,7 +307,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         </div>
                         <div class="mb-4">
                             <span class="text-gray-400">Response:</span>
-                            <div class="text-gray-200 whitespace-pre-wrap mt-2">${response.response_data?.choices?.[0]?.message?.content || 'No response content'}</div>
+                            <div class="text-gray-200 whitespace-pre-wrap mt-2">${response.content || 'No response content'}</div>
                         </div>
                         <div>
                             <span class="text-gray-400">Details:</span>
@@ -334,7 +337,13 @@ document.addEventListener('DOMContentLoaded', () => {
                                 [&::-webkit-scrollbar-thumb]:bg-dark-600 [&::-webkit-scrollbar-thumb]:rounded-full 
                                 [&::-webkit-scrollbar-track]:bg-dark-800 [&::-webkit-scrollbar-track]:rounded-full
                                 [&::-webkit-scrollbar-corner]:bg-dark-800">
-                                <pre class="text-sm font-mono bg-black p-4 min-w-max">${prettyPrintJSON(response.response_data || {})}</pre>
+                                <pre class="text-sm font-mono bg-black p-4 min-w-max">${prettyPrintJSON({
+                                    model: response.model,
+                                    finish_reason: response.finish_reason,
+                                    usage: response.usage,
+                                    conversation_id: response.conversation_id,
+                                    capture_ids: response.capture_ids
+                                })}</pre>
                             </div>`;
                         } catch (err) {
                             console.error('Error displaying JSON:', err);
@@ -374,8 +383,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 imgWrapper.className = 'relative group';
                 
                 const img = document.createElement('img');
-                img.src = `data:image/png;base64,${capture.image_data}`;
+                img.src = capture.thumbnail_url;
                 img.alt = 'Archived Screenshot';
+                img.loading = 'lazy';
+                img.title = 'Double-click to open full size';
+                img.addEventListener('dblclick', () => window.open(capture.image_url, '_blank'));
                 img.className = 'draggable-image w-full h-32 object-cover rounded-lg shadow-lg cursor-move';
                 img.draggable = true;
                 img.dataset.imageId = capture._id;
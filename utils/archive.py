@@ -0,0 +1,173 @@
+"""Streaming export and import of captures and responses.
+
+An archive is a tar stream. Captures are written in batches: the raw image
+files of a batch (`captures/<id>.<ext>`) followed by an NDJSON manifest chunk
+(`manifest/captures-<n>.ndjson`) describing them. Responses follow as
+`manifest/responses-<n>.ndjson` chunks. Exports stream each image out as soon
+as it is written, holding only one image plus a batch of manifest entries.
+Imports hold one batch of images until its manifest chunk arrives.
+"""
+import io
+import base64
+import logging
+import tarfile
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, BinaryIO
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from utils.db import MongoDB
+from utils.sampling import perceptual_hash
+
+EXPORT_BATCH_SIZE = 200
+# Captures fetched per cursor round trip; each carries a full image
+EXPORT_IMAGE_FETCH_SIZE = 10
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only file object whose contents are drained as the tar stream grows."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def time_range_query(since: Optional[datetime], until: Optional[datetime]) -> Dict[str, Any]:
+    """Build a timestamp filter for an optional time range."""
+    timestamp: Dict[str, datetime] = {}
+    if since:
+        timestamp['$gte'] = since
+    if until:
+        timestamp['$lt'] = until
+    return {'timestamp': timestamp} if timestamp else {}
+
+
+def _in_range(doc: Dict[str, Any], since: Optional[datetime], until: Optional[datetime]) -> bool:
+    if not (since or until):
+        return True
+    # Documents without a timestamp can't be placed in a time range
+    timestamp = doc.get('timestamp')
+    if not isinstance(timestamp, datetime):
+        return False
+    return not ((since and timestamp < since) or (until and timestamp >= until))
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_archive(db: MongoDB, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   include_captures: bool = True, include_responses: bool = True,
+                   batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Yield a tar archive of captures and responses chunk by chunk."""
+    buffer = _ChunkBuffer()
+    tar = tarfile.open(fileobj=buffer, mode='w|')
+    query = time_range_query(since, until)
+    exported = {'captures': 0, 'responses': 0}
+
+    def write_manifest(kind: str, chunk: int, docs: List[Dict[str, Any]]) -> None:
+        lines = ''.join(json_util.dumps(doc) + '\n' for doc in docs)
+        _add_bytes(tar, f"manifest/{kind}-{chunk:06d}.ndjson", lines.encode('utf-8'))
+        exported[kind] += len(docs)
+
+    if include_captures:
+        chunk, entries = 0, []
+        cursor = db.captures.find(query, {'variants': 0}).sort('timestamp', 1).batch_size(EXPORT_IMAGE_FETCH_SIZE)
+        for capture in cursor:
+            entry = dict(capture)
+            entry['file'] = f"captures/{capture['_id']}.{capture.get('file_type', 'png')}"
+            _add_bytes(tar, entry['file'], base64.b64decode(entry.pop('image_data')))
+            # Hand each image to the client right away; only manifest entries are batched
+            yield buffer.drain()
+            entries.append(entry)
+            if len(entries) >= batch_size:
+                chunk += 1
+                write_manifest('captures', chunk, entries)
+                entries = []
+                yield buffer.drain()
+        if entries:
+            write_manifest('captures', chunk + 1, entries)
+        yield buffer.drain()
+
+    if include_responses:
+        chunk, entries = 0, []
+        for response in db.responses.find(query).sort('timestamp', 1).batch_size(batch_size):
+            entries.append(response)
+            if len(entries) >= batch_size:
+                chunk += 1
+                write_manifest('responses', chunk, entries)
+                entries = []
+                yield buffer.drain()
+        if entries:
+            write_manifest('responses', chunk + 1, entries)
+
+    tar.close()
+    yield buffer.drain()
+    logging.info(f"Exported {exported['captures']} captures and {exported['responses']} responses")
+
+
+def _insert(collection: Any, docs: List[Dict[str, Any]]) -> int:
+    """Bulk insert, skipping documents whose _id already exists."""
+    if not docs:
+        return 0
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        other_errors = [error for error in e.details['writeErrors'] if error['code'] != 11000]
+        if other_errors:
+            raise
+        return e.details['nInserted']
+
+
+def import_archive(db: MongoDB, fileobj: BinaryIO, since: Optional[datetime] = None,
+                   until: Optional[datetime] = None) -> Dict[str, int]:
+    """Read an archive stream into the database. Existing documents are left untouched."""
+    imported = {'captures': 0, 'responses': 0, 'skipped': 0}
+    pending_files: Dict[str, bytes] = {}
+
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            data = tar.extractfile(member).read()
+
+            if member.name.startswith('captures/'):
+                pending_files[member.name] = data
+            elif member.name.startswith('manifest/captures-'):
+                docs = []
+                for line in data.decode('utf-8').splitlines():
+                    doc = json_util.loads(line)
+                    image = pending_files.pop(doc.pop('file'), None)
+                    if image is None or not _in_range(doc, since, until):
+                        imported['skipped'] += 1
+                        continue
+                    doc['image_data'] = base64.b64encode(image).decode('utf-8')
+                    doc.setdefault('archived', False)
+                    if 'phash' not in doc:
+                        doc['phash'] = perceptual_hash(image)
+                    docs.append(doc)
+                imported['captures'] += _insert(db.captures, docs)
+                pending_files.clear()
+            elif member.name.startswith('manifest/responses-'):
+                docs = [doc for doc in (json_util.loads(line) for line in data.decode('utf-8').splitlines())
+                        if _in_range(doc, since, until)]
+                imported['responses'] += _insert(db.responses, docs)
+
+    logging.info(f"Imported {imported['captures']} captures and {imported['responses']} responses "
+                 f"({imported['skipped']} captures skipped)")
+    return imported
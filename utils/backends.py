@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import httpx
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+from utils.fake_openai import fake_completion
+
+# Prompts containing any of these words are routed to the large model under MODEL_ROUTING=auto.
+# Whole words only, so "thread", "already" or "account" don't count.
+DETAIL_PATTERN = re.compile(
+    r"\b(details?|detailed|describ\w*|description|explain\w*|explanation|compar\w*|analy[sz]\w*|why"
+    r"|read|reads|reading|count|counts|counting|list|lists|listing)\b",
+    re.IGNORECASE
+)
+
+
+class ModelBackend(ABC):
+    """Interface for chat completion backends."""
+
+    @abstractmethod
+    def complete(self, model: str, messages: List[Dict[str, Any]], max_tokens: int) -> ChatCompletion:
+        """Run one chat completion against `model`."""
+
+
+class OpenAICompatibleBackend(ModelBackend):
+    """The OpenAI API, or any server implementing its chat completions endpoint."""
+
+    def __init__(self, api_key: str, base_url: Optional[str], http_client: httpx.Client) -> None:
+        # Retries are handled by OpenAIClient so the SDK's own are disabled
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    def complete(self, model: str, messages: List[Dict[str, Any]], max_tokens: int) -> ChatCompletion:
+        return self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "text"},
+            temperature=1,
+            max_tokens=max_tokens,
+            top_p=1,
+            frequency_penalty=0,
+            presence_penalty=0
+        )
+
+
+class FakeBackend(ModelBackend):
+    """Deterministic in-process backend for tests and load runs."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+
+    def complete(self, model: str, messages: List[Dict[str, Any]], max_tokens: int) -> ChatCompletion:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatCompletion.model_validate(fake_completion({'model': model, 'messages': messages}))
+
+
+@dataclass
+class ModelRoute:
+    """A concrete model on a named backend."""
+    backend: str
+    model: str
+
+
+DEFAULT_ALIASES = {
+    'large': {'backend': 'openai', 'model': 'gpt-4o'},
+    'small': {'backend': 'openai', 'model': 'gpt-4o-mini'},
+    'local': {'backend': 'local', 'model': os.getenv("LOCAL_MODEL_NAME", "llava")},
+    'fake': {'backend': 'fake', 'model': 'fake-vision'},
+}
+
+
+class ModelRouter:
+    """Resolves the model for a request.
+
+    An explicit model may be an alias (`large`, `small`, `local`, `fake`, or any
+    defined in MODEL_ALIASES), `<backend>:<model>` for a configured backend, or
+    a bare model name on the default backend (which may itself contain colons,
+    like fine-tuned `ft:` names). Explicit model names must be allowed by
+    MODEL_ALLOWLIST: comma separated names, `*` for any, and by default only the
+    models the aliases point at. Without a model, MODEL_ROUTING picks the alias:
+    a fixed alias name, or `auto` to send short simple prompts to `small` and
+    everything else to `large`.
+    """
+
+    def __init__(self, backends: Iterable[str] = ()) -> None:
+        aliases = {**DEFAULT_ALIASES, **json.loads(os.getenv("MODEL_ALIASES", "{}"))}
+        self.aliases = {name: ModelRoute(**route) for name, route in aliases.items()}
+        self.backends = set(backends)
+        self.routing = os.getenv("MODEL_ROUTING", "large")
+        self.simple_prompt_words = int(os.getenv("SIMPLE_PROMPT_MAX_WORDS", "20"))
+        self.default_backend = self.aliases['large'].backend
+        allowlist = os.getenv("MODEL_ALLOWLIST")
+        self.allowed_models = ({name.strip() for name in allowlist.split(',') if name.strip()} if allowlist
+                               else {route.model for route in self.aliases.values()})
+
+    def resolve(self, message: str, model: Optional[str] = None) -> Tuple[str, ModelRoute]:
+        """Return the alias (or model name) used and the route it points at.
+
+        Raises ValueError for models that are not allowed or whose backend is
+        not configured.
+        """
+        if model:
+            if model in self.aliases:
+                route = self.aliases[model]
+            else:
+                backend, separator, name = model.partition(':')
+                if separator and backend in self.backends:
+                    route = ModelRoute(backend, name)
+                else:
+                    route = ModelRoute(self.default_backend, model)
+                if '*' not in self.allowed_models and route.model not in self.allowed_models:
+                    raise ValueError(f"Model '{model}' is not allowed")
+            alias = model
+        else:
+            alias = self.routing
+            if alias == 'auto':
+                alias = 'large' if self._is_detailed(message) else 'small'
+            route = self.aliases[alias]
+
+        if route.backend not in self.backends:
+            raise ValueError(f"Model backend '{route.backend}' is not configured")
+        return alias, route
+
+    def _is_detailed(self, message: str) -> bool:
+        return len(message.split()) > self.simple_prompt_words or bool(DETAIL_PATTERN.search(message))
+
+
+def make_http_client(pool_size: int) -> httpx.Client:
+    """Keep-alive connection pool with explicit timeouts.
+
+    When every connection is busy, callers wait up to the pool timeout instead
+    of piling up sockets.
+    """
+    return httpx.Client(
+        timeout=httpx.Timeout(
+            float(os.getenv("OPENAI_READ_TIMEOUT", "60")),
+            connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+            pool=float(os.getenv("OPENAI_POOL_TIMEOUT", "10"))
+        ),
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    )
+
+
+def build_backends(pool_size: int) -> Dict[str, ModelBackend]:
+    """Create every backend that is configured in the environment."""
+    backends: Dict[str, ModelBackend] = {'fake': FakeBackend(float(os.getenv("FAKE_MODEL_LATENCY", "0")))}
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        # OPENAI_BASE_URL points the client at a compatible endpoint, e.g. utils.fake_openai
+        backends['openai'] = OpenAICompatibleBackend(api_key, os.getenv("OPENAI_BASE_URL") or None,
+                                                     make_http_client(pool_size))
+    else:
+        logging.warning("OPENAI_API_KEY not set, the openai backend is disabled")
+
+    local_url = os.getenv("LOCAL_MODEL_BASE_URL")
+    if local_url:
+        backends['local'] = OpenAICompatibleBackend(os.getenv("LOCAL_MODEL_API_KEY", "local"), local_url,
+                                                    make_http_client(pool_size))
+    return backends
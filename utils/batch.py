@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import logging
+import tempfile
+from typing import Dict, Any, List, Optional, TextIO
+from datetime import datetime
+from pathlib import Path
+
+from utils.db import MongoDB, capture_mimetype
+from utils.openai_client import OpenAIClient
+
+# Batch API job states that will not change any more
+FINAL_STATES = {'completed', 'failed', 'expired', 'cancelled'}
+
+# Batch API limits per input file; larger runs are split across several batches
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(190 * 1024 * 1024)))
+
+
+class BatchProcessor:
+    """Offline analysis of stored captures through the OpenAI Batch API."""
+
+    def __init__(self, db: MongoDB, openai_client: OpenAIClient,
+                 model: str = "gpt-4o", max_tokens: int = 2048) -> None:
+        self.db = db
+        self.openai_client = openai_client
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def build_input_files(self, query: Dict[str, Any], message: str, output_dir: Path,
+                          group_size: int = 1) -> List[Path]:
+        """Write one JSONL request per group of captures matching the query.
+
+        Captures are streamed from a cursor and written out as soon as a group
+        is full, so only `group_size` images are held in memory at a time. A new
+        file is started whenever the current one would pass the Batch API's
+        request count or size limit. Returns the files written.
+        """
+        paths: List[Path] = []
+        f: Optional[TextIO] = None
+        lines = size = total = 0
+
+        def write(line: str) -> None:
+            nonlocal f, lines, size, total
+            data = line + '\n'
+            length = len(data.encode('utf-8'))
+            if f is None or lines >= BATCH_MAX_REQUESTS or size + length > BATCH_MAX_FILE_BYTES:
+                if f is not None:
+                    f.close()
+                paths.append(Path(output_dir) / f"batch_input_{len(paths) + 1:03d}.jsonl")
+                f = open(paths[-1], 'w')
+                lines = size = 0
+            f.write(data)
+            lines += 1
+            size += length
+            total += 1
+
+        group: List[Dict[str, Any]] = []
+        try:
+            for capture in self.db.iter_captures(query):
+                group.append(capture)
+                if len(group) >= group_size:
+                    write(self._build_line(message, group))
+                    group = []
+            if group:
+                write(self._build_line(message, group))
+        finally:
+            if f is not None:
+                f.close()
+
+        logging.info(f"Wrote {total} batch requests to {len(paths)} input files")
+        return paths
+
+    def _build_line(self, message: str, captures: List[Dict[str, Any]]) -> str:
+        """Build a single Batch API request line for a group of captures."""
+        images = [{
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{capture_mimetype(capture)};base64,{capture['image_data']}"
+            }
+        } for capture in captures]
+
+        return json.dumps({
+            # The capture IDs travel with the request so results can be linked back
+            "custom_id": '-'.join(str(capture['_id']) for capture in captures),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "messages": [{
+                    "role": "user",
+                    "content": [{"type": "text", "text": message}] + images
+                }],
+                "max_tokens": self.max_tokens
+            }
+        })
+
+    def submit(self, input_path: Path) -> Optional[str]:
+        """Upload a JSONL input file and start a batch job."""
+        uploaded_file = self.openai_client.upload_file(input_path, purpose="batch")
+        if not uploaded_file:
+            return None
+        batch = self.openai_client.create_batch(uploaded_file.id)
+        return batch.id
+
+    def wait(self, batch_id: str, poll_interval: float = 30.0,
+             timeout: Optional[float] = None) -> Any:
+        """Poll a batch job until it reaches a final state."""
+        started = time.monotonic()
+        while True:
+            batch = self.openai_client.get_batch(batch_id)
+            logging.info(f"Batch {batch_id} status: {batch.status}")
+            if batch.status in FINAL_STATES:
+                return batch
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch {batch_id} did not finish within {timeout} seconds")
+            time.sleep(poll_interval)
+
+    def ingest(self, batch: Any, message: str, chunk_size: int = 500) -> int:
+        """Stream batch results into the responses collection in bulk writes."""
+        if not batch.output_file_id:
+            logging.warning(f"Batch {batch.id} has no output file")
+            return 0
+
+        saved = 0
+        pending: List[Dict[str, Any]] = []
+        for line in self.openai_client.iter_file_lines(batch.output_file_id):
+            result = json.loads(line)
+            response = result.get('response') or {}
+            if result.get('error') or response.get('status_code') != 200:
+                logging.error(f"Batch request {result.get('custom_id')} failed: "
+                              f"{result.get('error') or response.get('status_code')}")
+                continue
+
+            pending.append({
+                'message': message,
+                'response_data': response['body'],
+                'capture_ids': result['custom_id'].split('-'),
+                'timestamp': datetime.now()
+            })
+            if len(pending) >= chunk_size:
+                saved += len(self.db.save_responses(pending))
+                pending = []
+
+        if pending:
+            saved += len(self.db.save_responses(pending))
+
+        logging.info(f"Ingested {saved} responses from batch {batch.id}")
+        return saved
+
+    def run(self, query: Dict[str, Any], message: str, group_size: int = 1,
+            poll_interval: float = 30.0, timeout: Optional[float] = None) -> int:
+        """Build, submit, wait for and ingest batch jobs. Returns responses saved."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_paths = self.build_input_files(query, message, Path(tmp_dir), group_size)
+            if not input_paths:
+                logging.info("No captures matched the batch query")
+                return 0
+            batch_ids = []
+            for input_path in input_paths:
+                batch_id = self.submit(input_path)
+                if not batch_id:
+                    raise RuntimeError(f"Failed to upload batch input file {input_path.name}")
+                batch_ids.append(batch_id)
+
+        # Completed batches are ingested even when another one of the run fails
+        saved = 0
+        failed = []
+        for batch_id in batch_ids:
+            batch = self.wait(batch_id, poll_interval, timeout)
+            if batch.status != 'completed':
+                logging.error(f"Batch {batch_id} ended with status {batch.status}")
+                failed.append(batch_id)
+                continue
+            saved += self.ingest(batch, message)
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(batch_ids)} batches did not complete: "
+                               f"{', '.join(failed)}")
+        return saved
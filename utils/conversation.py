@@ -0,0 +1,166 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set
+
+from bson import ObjectId
+
+from utils.db import MongoDB, capture_mimetype
+from utils.openai_client import OpenAIClient
+
+# Rough token costs used for budgeting; exact counts come back in the usage data.
+# Earlier images are resent at low detail, which costs a flat 85 tokens each.
+IMAGE_TOKENS = 85
+CHARS_PER_TOKEN = 4
+
+DESCRIBE_PROMPT = ("Describe this image in two or three factual sentences, "
+                   "covering the people, objects, text and activity visible.")
+
+
+def low_detail_image(db: MongoDB, capture_id: str) -> Optional[Dict[str, Any]]:
+    """Build a low-detail image_url content part for a stored capture."""
+    capture = db.get_capture(capture_id, {'image_data': 1, 'file_type': 1})
+    if not capture:
+        return None
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{capture_mimetype(capture)};base64,{capture['image_data']}",
+            "detail": "low"
+        }
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def response_content(response: Dict[str, Any]) -> str:
+    """Extract the assistant reply from a stored response document."""
+    return response.get('content') or ''
+
+
+class ContextBuilder:
+    """Assembles earlier conversation turns into chat history within a token budget."""
+
+    def __init__(self, db: MongoDB, token_budget: Optional[int] = None) -> None:
+        self.db = db
+        self.token_budget = token_budget or int(os.getenv("CONVERSATION_TOKEN_BUDGET", "4000"))
+
+    def build(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Build chat messages for the earlier turns of a conversation.
+
+        Turns are added newest first until the budget is spent, then returned in
+        chronological order. Images from earlier turns are replaced by their
+        cached descriptions; an image is only resent when it has no description
+        yet and the budget still allows it.
+        """
+        turns = self.db.get_conversation_turns(conversation_id)
+        descriptions = self.db.get_capture_descriptions(
+            list({str(id) for turn in turns for id in turn.get('capture_ids', [])}))
+
+        remaining = self.token_budget
+        history: List[Dict[str, Any]] = []
+        for turn in turns:
+            answer = response_content(turn)
+            user_text = turn.get('message', '')
+            images: List[Dict[str, Any]] = []
+            notes: List[str] = []
+            cost = estimate_tokens(user_text) + estimate_tokens(answer)
+
+            for capture_id in (str(id) for id in turn.get('capture_ids', [])):
+                description = descriptions.get(capture_id)
+                if description:
+                    note = f"[Image {capture_id}: {description}]"
+                    notes.append(note)
+                    cost += estimate_tokens(note)
+                elif remaining - cost >= IMAGE_TOKENS:
+                    image = low_detail_image(self.db, capture_id)
+                    if image:
+                        images.append(image)
+                        cost += IMAGE_TOKENS
+                else:
+                    notes.append(f"[Image {capture_id} omitted]")
+
+            if cost > remaining:
+                break
+            remaining -= cost
+
+            user_content = [{"type": "text", "text": '\n'.join([user_text] + notes)}] + images
+            history[:0] = [
+                {"role": "user", "content": user_content},
+                {"role": "assistant", "content": answer}
+            ]
+
+        logging.info(f"Built context for conversation {conversation_id}: "
+                     f"{len(history) // 2} of {len(turns)} turns, "
+                     f"{self.token_budget - remaining} estimated tokens")
+        return history
+
+
+class CaptureDescriber:
+    """Generates and caches descriptions of conversation captures in the background.
+
+    Runs on its own small pool, so description calls never queue ahead of
+    batch requests on the client's executor. A conversation that already has
+    a pass queued or running is skipped, as are captures being described for
+    another conversation.
+    """
+
+    def __init__(self, db: MongoDB, openai_client: OpenAIClient, max_workers: Optional[int] = None) -> None:
+        self.db = db
+        self.openai_client = openai_client
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("DESCRIBE_WORKERS", "1")),
+            thread_name_prefix="describe"
+        )
+        self._lock = threading.Lock()
+        self._conversations: Set[str] = set()
+        self._captures: Set[str] = set()
+
+    def submit(self, conversation_id: str) -> bool:
+        """Queue a description pass for a conversation unless one is already pending."""
+        with self._lock:
+            if conversation_id in self._conversations:
+                return False
+            self._conversations.add(conversation_id)
+        self.executor.submit(self._describe, conversation_id)
+        return True
+
+    def _describe(self, conversation_id: str) -> None:
+        try:
+            capture_ids = list({str(id) for turn in self.db.get_conversation_turns(conversation_id)
+                                for id in turn.get('capture_ids', [])})
+            missing = [id for id, description in self.db.get_capture_descriptions(capture_ids).items()
+                       if not description]
+            for capture_id in missing:
+                with self._lock:
+                    if capture_id in self._captures:
+                        continue
+                    self._captures.add(capture_id)
+                try:
+                    self._describe_capture(capture_id)
+                finally:
+                    with self._lock:
+                        self._captures.discard(capture_id)
+        finally:
+            with self._lock:
+                self._conversations.discard(conversation_id)
+
+    def _describe_capture(self, capture_id: str) -> None:
+        try:
+            image = low_detail_image(self.db, capture_id)
+            if not image:
+                return
+            response = self.openai_client.process_request(DESCRIBE_PROMPT, [image])
+            self.db.save_capture_description(capture_id, response.choices[0].message.content)
+            logging.info(f"Cached description for capture {capture_id}")
+        except Exception as e:
+            logging.error(f"Error describing capture {capture_id}: {e}")
+
+
+def new_conversation_id() -> str:
+    """Create an identifier for a new conversation thread."""
+    return str(ObjectId())
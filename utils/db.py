@@ -1,14 +1,54 @@
 import os
+import json
+import zlib
 import logging
-from typing import Optional, Dict, Any, List
+import mimetypes
+from typing import Optional, Dict, Any, Iterator, List
 from datetime import datetime
 from pathlib import Path
 import base64
 
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
 from pymongo.database import Database
 from pymongo.collection import Collection
-from bson import ObjectId
+from bson import ObjectId, Binary
+
+from utils.events import notify_write
+from utils.sampling import perceptual_hash, every_nth, most_diverse
+
+# Upper bound on the lightweight candidate documents scanned when sampling
+MAX_SAMPLING_CANDIDATES = 10000
+
+# Listings return metadata only; images are fetched per capture on demand
+CAPTURE_LIST_PROJECTION = {'image_data': 0, 'variants': 0}
+
+# Keep a zlib-compressed copy of the full OpenAI payload next to the extracted fields
+STORE_RAW_RESPONSES = os.getenv("STORE_RAW_RESPONSES", "1") == "1"
+
+def slim_response_fields(response_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the fields the app uses from a chat completion payload."""
+    choices = response_data.get('choices') or [{}]
+    usage = response_data.get('usage') or {}
+    fields = {
+        'content': (choices[0].get('message') or {}).get('content') or '',
+        'finish_reason': choices[0].get('finish_reason'),
+        'model': response_data.get('model'),
+        'usage': {
+            'prompt_tokens': usage.get('prompt_tokens', 0),
+            'completion_tokens': usage.get('completion_tokens', 0),
+            'total_tokens': usage.get('total_tokens', 0)
+        }
+    }
+    if STORE_RAW_RESPONSES and response_data:
+        fields['raw_response'] = Binary(zlib.compress(json.dumps(response_data, default=str).encode('utf-8')))
+    return fields
+
+
+def capture_mimetype(capture: Dict[str, Any]) -> str:
+    """MIME type of a capture's stored image, e.g. `image/jpeg` for a `jpg` file type."""
+    return mimetypes.guess_type(f"capture.{capture.get('file_type') or 'png'}")[0] or 'image/png'
+
 
 class MongoDB:
     """MongoDB client wrapper for handling database operations."""
@@ -23,9 +63,19 @@ class MongoDB:
         
         # Create indexes
         self.captures.create_index("timestamp")
-        self.captures.create_index("archived")  # Add index for archived status
+        # Recent and archived listings are range scans on (archived, timestamp)
+        self.captures.create_index([("archived", ASCENDING), ("timestamp", DESCENDING)])
+        # Serves capture selection by source and time window
+        self.captures.create_index([("source", ASCENDING), ("archived", ASCENDING), ("timestamp", DESCENDING)])
         self.responses.create_index("timestamp")
         self.responses.create_index("capture_ids")
+        self.responses.create_index([("conversation_id", ASCENDING), ("timestamp", DESCENDING)], sparse=True)
+        # Keyword search over the question and the assistant reply
+        try:
+            self.responses.create_index([("message", TEXT), ("content", TEXT)], name="responses_content_text")
+        except OperationFailure as e:
+            # Only one text index is allowed; the slim-responses migration replaces the old one
+            logging.warning(f"Response text index not created yet: {e}")
 
     def save_capture(self, image_path: Path) -> Optional[str]:
         """Save capture information to database."""
@@ -41,11 +91,14 @@ class MongoDB:
                 'image_data': base64.b64encode(image_binary).decode('utf-8'),
                 'file_type': image_path.suffix[1:],  # Remove the dot from extension
                 'original_path': str(image_path),
+                'source': f"file:{image_path.parent}",
+                'phash': perceptual_hash(image_binary),
                 'archived': False  # Add archived status
             }
             
             result = self.captures.insert_one(capture)
             logging.info(f"Saved capture to database with ID: {result.inserted_id}")
+            notify_write('captures')
             return str(result.inserted_id)
             
         except Exception as e:
@@ -55,26 +108,90 @@ class MongoDB:
     def save_response(self, response_data: Dict[str, Any]) -> Optional[str]:
         """Save OpenAI response to database."""
         try:
-            # Create response document
-            response = {
-                'timestamp': response_data.get('timestamp', datetime.now()),
-                'message': response_data.get('message', ''),
-                'response_data': response_data.get('response_data', {}),
-                'capture_ids': [ObjectId(id) for id in response_data.get('capture_ids', [])]
-            }
-            
-            result = self.responses.insert_one(response)
+            result = self.responses.insert_one(self._build_response(response_data))
             logging.info(f"Saved response to database with ID: {result.inserted_id}")
+            notify_write('responses')
             return str(result.inserted_id)
             
         except Exception as e:
             logging.error(f"Error saving response to database: {e}")
             return None
 
-    def get_capture(self, capture_id: str) -> Optional[Dict[str, Any]]:
+    def save_responses(self, responses_data: List[Dict[str, Any]]) -> List[str]:
+        """Save several OpenAI responses to database in one bulk write."""
+        if not responses_data:
+            return []
+
+        try:
+            result = self.responses.insert_many([self._build_response(response_data)
+                                                 for response_data in responses_data])
+            logging.info(f"Saved {len(result.inserted_ids)} responses to database")
+            notify_write('responses')
+            return [str(id) for id in result.inserted_ids]
+
+        except Exception as e:
+            logging.error(f"Error saving responses to database: {e}")
+            return []
+
+    def _build_response(self, response_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a response document."""
+        response = {
+            'timestamp': response_data.get('timestamp', datetime.now()),
+            'message': response_data.get('message', ''),
+            'capture_ids': [ObjectId(id) for id in response_data.get('capture_ids', [])],
+            **slim_response_fields(response_data.get('response_data', {}))
+        }
+        if response_data.get('conversation_id'):
+            response['conversation_id'] = response_data['conversation_id']
+        return response
+
+    def get_raw_response(self, response_id: str) -> Optional[Dict[str, Any]]:
+        """Get the full OpenAI payload stored with a response, if it was kept."""
+        try:
+            response = self.responses.find_one({'_id': ObjectId(response_id)}, {'raw_response': 1})
+            if not response or 'raw_response' not in response:
+                return None
+            return json.loads(zlib.decompress(response['raw_response']))
+        except Exception as e:
+            logging.error(f"Error getting raw response from database: {e}")
+            return None
+
+    def get_conversation_turns(self, conversation_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get the most recent turns of a conversation, newest first."""
+        try:
+            return list(self.responses.find({'conversation_id': conversation_id}, {'raw_response': 0})
+                        .sort('timestamp', -1).limit(limit))
+        except Exception as e:
+            logging.error(f"Error getting conversation turns: {e}")
+            return []
+
+    def get_capture_descriptions(self, capture_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Get the cached textual description of each capture, if any."""
+        try:
+            docs = self.captures.find({'_id': {'$in': [ObjectId(id) for id in capture_ids]}},
+                                      {'description': 1})
+            return {str(doc['_id']): doc.get('description') for doc in docs}
+        except Exception as e:
+            logging.error(f"Error getting capture descriptions: {e}")
+            return {}
+
+    def save_capture_description(self, capture_id: str, description: str) -> bool:
+        """Cache a textual description of a capture for reuse in later prompts."""
+        try:
+            result = self.captures.update_one(
+                {'_id': ObjectId(capture_id)},
+                {'$set': {'description': description}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logging.error(f"Error saving capture description: {e}")
+            return False
+
+    def get_capture(self, capture_id: str,
+                    projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Get a capture from the database."""
         try:
-            result = self.captures.find_one({'_id': ObjectId(capture_id)})
+            result = self.captures.find_one({'_id': ObjectId(capture_id)}, projection)
             return result
         except Exception as e:
             logging.error(f"Error getting capture from database: {e}")
@@ -89,20 +206,73 @@ class MongoDB:
             logging.error(f"Error retrieving response from database: {e}")
             return None
 
-    def get_recent_captures(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_recent_captures(self, limit: int = 10,
+                            projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Get recent captures."""
-        return list(self.captures.find({
-            '$or': [
-                {'archived': False},
-                {'archived': {'$exists': False}}  # Include documents where archived field doesn't exist
-            ]
-        }).sort('timestamp', -1).limit(limit))
+        return list(self.captures.find({'archived': False}, projection).sort('timestamp', -1).limit(limit))
+
+    def get_captures(self, capture_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get captures by ID, newest first."""
+        try:
+            object_ids = [ObjectId(id) for id in capture_ids]
+            return list(self.captures.find({'_id': {'$in': object_ids}}).sort('timestamp', -1))
+        except Exception as e:
+            logging.error(f"Error getting captures from database: {e}")
+            return []
+
+    def select_captures(self, capture_ids: Optional[List[str]] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        source: Optional[str] = None, include_archived: bool = False,
+                        limit: int = 5, strategy: Optional[str] = None,
+                        step: int = 1) -> List[Dict[str, Any]]:
+        """Select captures to send by ID, time window, source and sampling strategy.
+
+        Sampling runs over lightweight documents without `image_data`; only the
+        selected captures are fetched in full.
+        """
+        try:
+            if capture_ids:
+                # Explicit IDs are sent as given; callers bound their number
+                return self.get_captures(capture_ids)
+
+            query: Dict[str, Any] = {}
+            if not include_archived:
+                query['archived'] = False
+            if source:
+                query['source'] = source
+            if since or until:
+                query['timestamp'] = {}
+                if since:
+                    query['timestamp']['$gte'] = since
+                if until:
+                    query['timestamp']['$lt'] = until
+
+            if strategy is None:
+                return list(self.captures.find(query).sort('timestamp', -1).limit(limit))
+
+            candidates = list(self.captures.find(query, {'image_data': 0})
+                              .sort('timestamp', -1).limit(MAX_SAMPLING_CANDIDATES))
+            if strategy == 'every_nth':
+                selected = every_nth(candidates, step)[:limit]
+            else:
+                # Captures without a phash (until migration 0003 reaches them) are skipped
+                selected = most_diverse(candidates, limit)
+
+            return self.get_captures([str(capture['_id']) for capture in selected])
+
+        except Exception as e:
+            logging.error(f"Error selecting captures: {e}")
+            return []
+
+    def iter_captures(self, query: Dict[str, Any], batch_size: int = 50) -> Iterator[Dict[str, Any]]:
+        """Stream captures matching a query, oldest first, without loading them all."""
+        return self.captures.find(query, {'variants': 0}).sort('timestamp', 1).batch_size(batch_size)
 
     def get_recent_responses(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent responses."""
-        return list(self.responses.find().sort('timestamp', -1).limit(limit))
+        return list(self.responses.find({}, {'raw_response': 0}).sort('timestamp', -1).limit(limit))
 
-    def save_capture_data(self, image_data: bytes) -> Optional[str]:
+    def save_capture_data(self, image_data: bytes, source: Optional[str] = None) -> Optional[str]:
         """Save raw image data to database."""
         try:
             # Create capture document
@@ -110,25 +280,55 @@ class MongoDB:
                 'timestamp': datetime.now(),
                 'image_data': base64.b64encode(image_data).decode('utf-8'),
                 'file_type': 'png',  # Default to PNG for raw data
+                'source': source,
+                'phash': perceptual_hash(image_data),
                 'archived': False  # Add archived status
             }
             
             result = self.captures.insert_one(capture)
             logging.info(f"Saved capture data to database with ID: {result.inserted_id}")
+            notify_write('captures')
             return str(result.inserted_id)
             
         except Exception as e:
             logging.error(f"Error saving capture data to database: {e}")
             return None
 
-    def get_archived_captures(self) -> List[Dict[str, Any]]:
+    def save_captures(self, captures: List[Dict[str, Any]]) -> List[str]:
+        """Save several prepared capture documents in one bulk write."""
+        if not captures:
+            return []
+
+        try:
+            result = self.captures.insert_many(captures)
+            logging.info(f"Saved {len(result.inserted_ids)} captures to database")
+            notify_write('captures')
+            return [str(id) for id in result.inserted_ids]
+
+        except Exception as e:
+            logging.error(f"Error saving captures to database: {e}")
+            return []
+
+    def get_archived_captures(self, projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Get all archived captures from the database."""
         try:
-            return list(self.captures.find({'archived': True}).sort('timestamp', -1))
+            return list(self.captures.find({'archived': True}, projection).sort('timestamp', -1))
         except Exception as e:
             logging.error(f"Error getting archived captures: {e}")
             return []
 
+    def save_capture_variants(self, capture_id: str, variants: Dict[str, Dict[str, Any]]) -> bool:
+        """Store downscaled variants (thumbnail, preview) alongside a capture."""
+        try:
+            result = self.captures.update_one(
+                {'_id': ObjectId(capture_id)},
+                {'$set': {f'variants.{size}': variant for size, variant in variants.items()}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logging.error(f"Error saving capture variants: {e}")
+            return False
+
     def archive_capture(self, capture_id: str) -> bool:
         """Mark a capture as archived in the database."""
         try:
@@ -136,11 +336,25 @@ class MongoDB:
                 {'_id': ObjectId(capture_id)},
                 {'$set': {'archived': True}}
             )
+            notify_write('captures')
             return result.modified_count > 0
         except Exception as e:
             logging.error(f"Error archiving capture: {e}")
             return False
 
+    def archive_captures(self, capture_ids: List[str]) -> int:
+        """Mark several captures as archived in one bulk write."""
+        try:
+            result = self.captures.update_many(
+                {'_id': {'$in': [ObjectId(id) for id in capture_ids]}},
+                {'$set': {'archived': True}}
+            )
+            notify_write('captures')
+            return result.modified_count
+        except Exception as e:
+            logging.error(f"Error archiving captures: {e}")
+            return 0
+
     def unarchive_capture(self, capture_id: str) -> bool:
         """Mark a capture as not archived in the database."""
         try:
@@ -148,6 +362,7 @@ class MongoDB:
                 {'_id': ObjectId(capture_id)},
                 {'$set': {'archived': False}}
             )
+            notify_write('captures')
             return result.modified_count > 0
         except Exception as e:
             logging.error(f"Error unarchiving capture: {e}")
@@ -157,6 +372,7 @@ class MongoDB:
         """Delete a capture from the database."""
         try:
             result = self.captures.delete_one({'_id': ObjectId(capture_id)})
+            notify_write('captures')
             success = result.deleted_count > 0
             if success:
                 logging.info(f"Deleted capture {capture_id} from database")
@@ -169,6 +385,7 @@ class MongoDB:
         """Delete a response from the database."""
         try:
             result = self.responses.delete_one({'_id': ObjectId(response_id)})
+            notify_write('responses')
             success = result.deleted_count > 0
             if success:
                 logging.info(f"Deleted response {response_id} from database")
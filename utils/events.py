@@ -0,0 +1,24 @@
+import logging
+import threading
+from typing import Callable, List
+
+# Callbacks invoked with the collection name after a write
+_write_listeners: List[Callable[[str], None]] = []
+_lock = threading.Lock()
+
+
+def on_write(callback: Callable[[str], None]) -> None:
+    """Register a callback for database write events."""
+    with _lock:
+        _write_listeners.append(callback)
+
+
+def notify_write(collection: str) -> None:
+    """Tell listeners that a collection changed."""
+    with _lock:
+        listeners = list(_write_listeners)
+    for callback in listeners:
+        try:
+            callback(collection)
+        except Exception as e:
+            logging.error(f"Error in write listener: {e}")
@@ -0,0 +1,220 @@
+"""Local stand-in for the parts of the OpenAI API this project uses.
+
+Run it with `python -m utils.fake_openai --port 8089` and point the app at it:
+
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=fake python main.py
+
+Responses are deterministic, so workflows can be exercised offline.
+"""
+import argparse
+import email
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def fake_completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a deterministic chat completion for a request body."""
+    texts: List[str] = []
+    image_count = 0
+    for message in body.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get('type') == 'text':
+                texts.append(part.get('text', ''))
+            elif part.get('type') == 'image_url':
+                image_count += 1
+
+    prompt = texts[-1] if texts else ''
+    answer = f"Fake response to: {prompt} ({image_count} image(s))"
+    prompt_tokens = sum(len(text.split()) for text in texts) + 85 * image_count
+    completion_tokens = len(answer.split())
+
+    return {
+        'id': f"chatcmpl-fake-{uuid.uuid4().hex[:12]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'gpt-4o'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': answer},
+            'logprobs': None,
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+
+
+class FakeOpenAIState:
+    """In-memory files and batches shared by all request handlers."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.files: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def add_file(self, filename: str, purpose: str, data: bytes) -> Dict[str, Any]:
+        file_obj = {
+            'id': f"file-fake-{uuid.uuid4().hex[:12]}",
+            'object': 'file',
+            'bytes': len(data),
+            'created_at': int(time.time()),
+            'filename': filename,
+            'purpose': purpose,
+            'status': 'processed'
+        }
+        with self.lock:
+            self.files[file_obj['id']] = (file_obj, data)
+        return file_obj
+
+    def run_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        """Process a batch synchronously and record its output file."""
+        _, data = self.files[input_file_id]
+        output_lines = []
+        for line in data.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            output_lines.append(json.dumps({
+                'id': f"batch_req_{uuid.uuid4().hex[:12]}",
+                'custom_id': request['custom_id'],
+                'response': {
+                    'status_code': 200,
+                    'request_id': uuid.uuid4().hex,
+                    'body': fake_completion(request.get('body', {}))
+                },
+                'error': None
+            }))
+
+        output_file = self.add_file('batch_output.jsonl', 'batch_output',
+                                    ('\n'.join(output_lines) + '\n').encode('utf-8'))
+        now = int(time.time())
+        batch = {
+            'id': f"batch_fake_{uuid.uuid4().hex[:12]}",
+            'object': 'batch',
+            'endpoint': endpoint,
+            'errors': None,
+            'input_file_id': input_file_id,
+            'completion_window': completion_window,
+            'status': 'completed',
+            'output_file_id': output_file['id'],
+            'error_file_id': None,
+            'created_at': now,
+            'completed_at': now,
+            'request_counts': {
+                'total': len(output_lines),
+                'completed': len(output_lines),
+                'failed': 0
+            }
+        }
+        with self.lock:
+            self.batches[batch['id']] = batch
+        return batch
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """HTTP handler implementing a subset of the OpenAI REST API."""
+
+    state: FakeOpenAIState
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.debug(f"fake_openai: {format % args}")
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json({'error': {'message': message, 'type': 'invalid_request_error'}}, status)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _read_multipart(self) -> Tuple[Dict[str, str], Optional[Tuple[str, bytes]]]:
+        """Parse a multipart upload into form fields and the uploaded file."""
+        raw = (f"Content-Type: {self.headers['Content-Type']}\r\n\r\n").encode('utf-8') + self._read_body()
+        message = email.message_from_bytes(raw)
+        fields: Dict[str, str] = {}
+        upload = None
+        for part in message.get_payload():
+            name = part.get_param('name', header='content-disposition')
+            filename = part.get_filename()
+            data = part.get_payload(decode=True) or b''
+            if filename:
+                upload = (filename, data)
+            else:
+                fields[name] = data.decode('utf-8')
+        return fields, upload
+
+    def do_POST(self) -> None:
+        path = self.path.split('?')[0].rstrip('/')
+        if path.endswith('/chat/completions'):
+            self._send_json(fake_completion(json.loads(self._read_body() or b'{}')))
+        elif path.endswith('/files'):
+            fields, upload = self._read_multipart()
+            if not upload:
+                return self._send_error(400, "Missing file")
+            self._send_json(self.state.add_file(upload[0], fields.get('purpose', ''), upload[1]))
+        elif path.endswith('/batches'):
+            body = json.loads(self._read_body() or b'{}')
+            if body.get('input_file_id') not in self.state.files:
+                return self._send_error(404, "Input file not found")
+            self._send_json(self.state.run_batch(body['input_file_id'],
+                                                 body.get('endpoint', '/v1/chat/completions'),
+                                                 body.get('completion_window', '24h')))
+        else:
+            self._send_error(404, f"Unknown route {path}")
+
+    def do_GET(self) -> None:
+        path = self.path.split('?')[0].rstrip('/')
+        batch_match = re.search(r'/batches/([^/]+)$', path)
+        content_match = re.search(r'/files/([^/]+)/content$', path)
+        if batch_match and batch_match.group(1) in self.state.batches:
+            self._send_json(self.state.batches[batch_match.group(1)])
+        elif content_match and content_match.group(1) in self.state.files:
+            _, data = self.state.files[content_match.group(1)]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_error(404, f"Unknown route {path}")
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8089) -> ThreadingHTTPServer:
+    """Create a fake OpenAI server with fresh in-memory state."""
+    handler = type('BoundFakeOpenAIHandler', (FakeOpenAIHandler,), {'state': FakeOpenAIState()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    server = make_server(args.host, args.port)
+    logging.info(f"Fake OpenAI endpoint listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import os
+import copy
+import json
+import time
+import queue
+import uuid
+import logging
+import atexit
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import Flask, g, has_request_context, request
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file exceeds `maxBytes` or is older than `interval` seconds.
+
+    Backups are numbered like RotatingFileHandler (`.1` is the newest), which
+    keeps them easy to read back in order. The age of an existing file is
+    taken from its first record, so restarts do not postpone rotation.
+    """
+
+    def __init__(self, filename: str, maxBytes: int, backupCount: int, interval: float) -> None:
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding='utf-8')
+        self.interval = interval
+        self.next_rollover = self._file_started() + interval
+
+    def _file_started(self) -> float:
+        """When the current file got its first record, or now if that can't be told."""
+        try:
+            with open(self.baseFilename, encoding='utf-8', errors='replace') as f:
+                first = f.readline().strip()
+        except OSError:
+            return time.time()
+        try:
+            if first.startswith('{'):
+                return datetime.fromisoformat(json.loads(first)['time']).timestamp()
+            return datetime.strptime(first[:19], DATE_FORMAT).timestamp()
+        except (ValueError, KeyError, TypeError):
+            return time.time()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval and time.time() >= self.next_rollover:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.next_rollover = time.time() + self.interval
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id to records logged during a request."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class TracebackQueueHandler(QueueHandler):
+    """QueueHandler that keeps the traceback in `exc_text` instead of folding it into the message.
+
+    The stock `prepare` merges the formatted traceback into `msg` and clears
+    the exception, so formatters on the listener side could no longer tell
+    them apart.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including request id and any structured extras."""
+
+    # Structured fields passed through `extra=` that are copied into the output
+    EXTRA_FIELDS = ('request_id', 'method', 'path', 'status', 'duration_ms', 'stage_timings')
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in self.EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(config: Any, log_to_file: bool = True) -> QueueListener:
+    """Route log records through a queue so request threads never block on disk.
+
+    The file handler rotates by size and age and writes plain text or JSON
+    lines depending on `config.LOG_FORMAT`. Only one process may rotate the
+    file, so other processes (such as the reloader's parent) pass
+    `log_to_file=False` and log to the console only.
+    """
+    handlers: List[logging.Handler] = []
+    if log_to_file:
+        handlers.append(_file_handler(config))
+
+    console_handler = logging.StreamHandler()  # Add console output
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    handlers.append(console_handler)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = TracebackQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers = [queue_handler]
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def _file_handler(config: Any) -> logging.Handler:
+    file_handler = SizeAndTimeRotatingFileHandler(
+        str(config.LOG_FILE),
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        interval=config.LOG_ROTATE_HOURS * 3600
+    )
+    if config.LOG_FORMAT == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    return file_handler
+
+
+def init_request_logging(app: Flask) -> None:
+    """Assign request ids and log one summary line with stage timings per request."""
+
+    @app.before_request
+    def start_request() -> None:
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.request_started = time.perf_counter()
+        g.stage_timings = {}
+
+    @app.after_request
+    def finish_request(response: Any) -> Any:
+        response.headers['X-Request-ID'] = g.request_id
+        # Static files and log polling would drown out everything else
+        if request.endpoint and not request.endpoint.endswith(('static', 'logs')):
+            duration_ms = round((time.perf_counter() - g.request_started) * 1000, 1)
+            logging.info(
+                f"{request.method} {request.path} {response.status_code} in {duration_ms}ms",
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': duration_ms,
+                    'stage_timings': g.stage_timings or None
+                }
+            )
+        return response
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of the current request for the request summary log line."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and 'stage_timings' in g:
+            g.stage_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def log_files(log_file: Path) -> List[Path]:
+    """The current log file followed by its rotated backups, newest first."""
+    log_file = Path(log_file)
+    files = [log_file] if log_file.exists() else []
+    index = 1
+    while True:
+        backup = log_file.with_name(f"{log_file.name}.{index}")
+        if not backup.exists():
+            return files
+        files.append(backup)
+        index += 1
+
+
+def tail_log_lines(log_file: Path, limit: int = 1000, chunk_size: int = 4096) -> Optional[List[str]]:
+    """Read the last `limit` lines across the log file and its backups, in chronological order.
+
+    Files are read backwards in chunks, so only the tail is touched. Returns
+    None when there are no log files at all.
+    """
+    files = log_files(log_file)
+    if not files:
+        return None
+
+    lines: List[str] = []
+    for path in files:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            while position > 0 and data.count(b'\n') <= limit - len(lines):
+                chunk_pos = max(position - chunk_size, 0)
+                f.seek(chunk_pos)
+                data = f.read(position - chunk_pos) + data
+                position = chunk_pos
+        lines = data.decode('utf-8', errors='replace').splitlines()[-(limit - len(lines)):] + lines
+        if len(lines) >= limit:
+            break
+    return lines[-limit:]
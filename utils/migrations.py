@@ -0,0 +1,202 @@
+"""One-time data migrations, recorded in the `migrations` collection.
+
+Schema migrations run at application startup, before requests are served.
+Background migrations are backfills the app tolerates being incomplete; they
+run on a thread after startup. Both can also be run by hand with
+`python -m utils.migrations`.
+"""
+import os
+import time
+import uuid
+import base64
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne, TEXT
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from utils.db import MongoDB, slim_response_fields
+from utils.sampling import perceptual_hash
+
+# Documents rewritten per bulk write in data migrations
+MIGRATION_BATCH_SIZE = 500
+# A running claim whose heartbeat is older than this belongs to a dead worker
+MIGRATION_LEASE_SECONDS = int(os.getenv("MIGRATION_LEASE_SECONDS", "120"))
+MIGRATION_POLL_SECONDS = 2
+
+
+def backfill_archived(db: MongoDB) -> None:
+    """Set `archived: False` on captures saved before the field existed."""
+    result = db.captures.update_many({'archived': {'$exists': False}}, {'$set': {'archived': False}})
+    logging.info(f"Backfilled archived field on {result.modified_count} captures")
+
+    # The (archived, timestamp) compound index makes the single-field one redundant
+    try:
+        db.captures.drop_index('archived_1')
+    except OperationFailure:
+        pass
+
+
+def slim_responses(db: MongoDB) -> None:
+    """Replace stored `response_data` payloads with extracted fields."""
+    converted = 0
+    pending: List[UpdateOne] = []
+    cursor = db.responses.find({'response_data': {'$exists': True}},
+                               {'response_data': 1}).batch_size(MIGRATION_BATCH_SIZE)
+    for response in cursor:
+        pending.append(UpdateOne(
+            {'_id': response['_id']},
+            {'$set': slim_response_fields(response.get('response_data') or {}),
+             '$unset': {'response_data': ''}}
+        ))
+        if len(pending) >= MIGRATION_BATCH_SIZE:
+            converted += db.responses.bulk_write(pending, ordered=False).modified_count
+            pending = []
+    if pending:
+        converted += db.responses.bulk_write(pending, ordered=False).modified_count
+    logging.info(f"Slimmed {converted} response documents")
+
+    # Point the text index at the new top-level content field
+    try:
+        db.responses.drop_index('responses_text')
+    except OperationFailure:
+        pass
+    db.responses.create_index([("message", TEXT), ("content", TEXT)], name="responses_content_text")
+
+
+def backfill_phashes(db: MongoDB) -> None:
+    """Compute perceptual hashes for captures saved before diverse sampling existed."""
+    hashed = 0
+    pending: List[UpdateOne] = []
+    cursor = db.captures.find({'phash': {'$exists': False}},
+                              {'image_data': 1}).batch_size(MIGRATION_BATCH_SIZE)
+    for capture in cursor:
+        phash = perceptual_hash(base64.b64decode(capture['image_data']))
+        # Unreadable images get None so they are not decoded again
+        pending.append(UpdateOne({'_id': capture['_id']}, {'$set': {'phash': phash}}))
+        if len(pending) >= MIGRATION_BATCH_SIZE:
+            hashed += db.captures.bulk_write(pending, ordered=False).modified_count
+            pending = []
+    if pending:
+        hashed += db.captures.bulk_write(pending, ordered=False).modified_count
+    logging.info(f"Backfilled perceptual hashes on {hashed} captures")
+
+
+# Applied in order; names must never change once released
+MIGRATIONS: List[Tuple[str, Callable[[MongoDB], None]]] = [
+    ('0001_backfill_archived', backfill_archived),
+    ('0002_slim_responses', slim_responses),
+]
+
+# Run after startup; resumable, since each one only touches documents still missing its field
+BACKGROUND_MIGRATIONS: List[Tuple[str, Callable[[MongoDB], None]]] = [
+    ('0003_backfill_phashes', backfill_phashes),
+]
+
+
+def _is_applied(record: Optional[Dict[str, Any]]) -> bool:
+    # Records written before claims existed have no status and were only saved on success
+    return record is not None and record.get('status', 'applied') == 'applied'
+
+
+def _claim(db: MongoDB, name: str, owner: str) -> bool:
+    """Claim a migration that is unrecorded, or whose running claim stopped heartbeating."""
+    now = datetime.now()
+    try:
+        db.db.migrations.insert_one({'_id': name, 'status': 'running', 'owner': owner,
+                                     'started_at': now, 'heartbeat_at': now})
+        return True
+    except DuplicateKeyError:
+        stale = now - timedelta(seconds=MIGRATION_LEASE_SECONDS)
+        return db.db.migrations.find_one_and_update(
+            {'_id': name, 'status': 'running',
+             '$or': [{'heartbeat_at': {'$lt': stale}}, {'heartbeat_at': {'$exists': False}}]},
+            {'$set': {'owner': owner, 'started_at': now, 'heartbeat_at': now}}
+        ) is not None
+
+
+def _apply(db: MongoDB, name: str, migration: Callable[[MongoDB], None], owner: str) -> None:
+    """Run a claimed migration, heartbeating its lease, and record the outcome."""
+    done = threading.Event()
+
+    def heartbeat() -> None:
+        while not done.wait(MIGRATION_LEASE_SECONDS / 3):
+            try:
+                db.db.migrations.update_one({'_id': name, 'owner': owner},
+                                            {'$set': {'heartbeat_at': datetime.now()}})
+            except Exception as e:
+                logging.error(f"Error renewing lease on migration {name}: {e}")
+
+    threading.Thread(target=heartbeat, name=f"migration-{name}", daemon=True).start()
+    logging.info(f"Running migration {name}")
+    try:
+        migration(db)
+        db.db.migrations.update_one({'_id': name, 'owner': owner},
+                                    {'$set': {'status': 'applied', 'applied_at': datetime.now()}})
+    except BaseException:
+        # Interrupted or failed: release the claim so the next start retries it
+        db.db.migrations.delete_one({'_id': name, 'owner': owner, 'status': 'running'})
+        raise
+    finally:
+        done.set()
+
+
+def run_migrations(db: MongoDB) -> List[str]:
+    """Apply every migration that has not been recorded yet, in order.
+
+    Each migration is claimed with an insert before it runs, so when several
+    workers start together only one of them applies it. The others wait for it
+    before moving on, so nobody runs later migrations or serves requests
+    against a half-migrated schema. Claims are leased: a worker that dies
+    without releasing its claim stops heartbeating, and the migration is
+    reclaimed after MIGRATION_LEASE_SECONDS.
+    """
+    owner = uuid.uuid4().hex
+    ran = []
+    for name, migration in MIGRATIONS:
+        waiting = False
+        while not _is_applied(db.db.migrations.find_one({'_id': name})):
+            if _claim(db, name, owner):
+                _apply(db, name, migration, owner)
+                ran.append(name)
+                break
+            if not waiting:
+                logging.info(f"Waiting for migration {name} to finish in another worker")
+                waiting = True
+            time.sleep(MIGRATION_POLL_SECONDS)
+    return ran
+
+
+def run_background_migrations(db: MongoDB) -> List[str]:
+    """Apply background migrations not applied or claimed by a live worker."""
+    owner = uuid.uuid4().hex
+    ran = []
+    for name, migration in BACKGROUND_MIGRATIONS:
+        if _is_applied(db.db.migrations.find_one({'_id': name})):
+            continue
+        if not _claim(db, name, owner):
+            logging.info(f"Background migration {name} is running in another worker")
+            continue
+        try:
+            _apply(db, name, migration, owner)
+            ran.append(name)
+        except Exception as e:
+            logging.error(f"Error running background migration {name}: {e}")
+    return ran
+
+
+def start_background_migrations(db: MongoDB) -> threading.Thread:
+    """Run background migrations on a daemon thread."""
+    thread = threading.Thread(target=run_background_migrations, args=(db,),
+                              name="background-migrations", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    db = MongoDB()
+    applied = run_migrations(db) + run_background_migrations(db)
+    logging.info(f"Applied {len(applied)} migrations")
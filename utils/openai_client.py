@@ -1,25 +1,92 @@
 import os
+import time
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple, Union
 from pathlib import Path
-from openai import OpenAI
+
+import httpx
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
 from openai.types.chat import ChatCompletion
 
+from utils.backends import ModelBackend, ModelRouter, OpenAICompatibleBackend, build_backends
+from utils.resilience import (CircuitBreaker, CircuitOpenError, ConcurrencyLimiter, Metrics,
+                              OverloadedError, backoff_delay)
+
+# HTTP status codes worth retrying: rate limiting and upstream server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class OpenAIClient:
-    """Wrapper for OpenAI API client."""
+    """Wrapper for OpenAI API client, routing chat requests across model backends."""
     def __init__(self) -> None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        # Bounded pool and shared rate-limit budget for concurrent requests
+        self.max_workers = int(os.getenv("OPENAI_MAX_WORKERS", "4"))
+        self.requests_per_minute = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60"))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="openai")
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+        # Process-wide cap on calls in flight; request threads queue for a slot, then get a 429.
+        # Each backend pool needs a connection per slot, or callers past the pool size would
+        # time out waiting for one instead of queueing here.
+        max_in_flight = int(os.getenv("OPENAI_MAX_IN_FLIGHT", str(self.max_workers * 2)))
+        pool_size = int(os.getenv("OPENAI_POOL_SIZE", str(max_in_flight)))
+        if pool_size < max_in_flight:
+            logging.warning(f"OPENAI_MAX_IN_FLIGHT={max_in_flight} exceeds OPENAI_POOL_SIZE={pool_size}, "
+                            f"capping calls in flight at {pool_size}")
+            max_in_flight = pool_size
+        self.concurrency = ConcurrencyLimiter(max_in_flight, float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10")))
+
+        # Retry policy; the SDK's own retries are disabled so these are the only ones
+        self.max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "20"))
+        self.metrics = Metrics()
+
+        # Each backend gets its own keep-alive pool, sized to the in-flight cap, and circuit breaker
+        self.backends: Dict[str, ModelBackend] = build_backends(pool_size)
+        self.breakers = {name: self._make_breaker(name) for name in self.backends}
+        self.router = ModelRouter(self.backends)
+
+        # The SDK client for OpenAI-only APIs (files, batches), if the key is configured
+        openai_backend = self.backends.get('openai')
+        self.client: Optional[OpenAI] = (openai_backend.client
+                                         if isinstance(openai_backend, OpenAICompatibleBackend) else None)
+
+    def _make_breaker(self, backend: str) -> CircuitBreaker:
+        return CircuitBreaker(
+            failure_threshold=int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("OPENAI_BREAKER_RESET", "30")),
+            on_transition=lambda previous, state: self.metrics.increment(f"circuit_{backend}_{state}")
+        )
+
+    def _require_openai(self) -> OpenAI:
+        if self.client is None:
             raise ValueError("OPENAI_API_KEY environment variable not set")
-        self.client = OpenAI(api_key=api_key)
+        return self.client
 
-    def upload_file(self, file_path: Path) -> Optional[Any]:
+    def _wait_for_rate_limit(self) -> None:
+        """Block until the rate-limit budget allows another request."""
+        if self.requests_per_minute <= 0:
+            return
+
+        interval = 60.0 / self.requests_per_minute
+        with self._rate_lock:
+            scheduled = max(time.monotonic(), self._next_request_at)
+            self._next_request_at = scheduled + interval
+
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def upload_file(self, file_path: Path, purpose: str = "vision") -> Optional[Any]:
         """Upload a file to OpenAI."""
         try:
             with open(file_path, "rb") as f:
-                uploaded_file = self.client.files.create(
+                uploaded_file = self._require_openai().files.create(
                     file=f,
-                    purpose="vision"
+                    purpose=purpose
                 )
             logging.info(f"File uploaded: {uploaded_file.filename} (ID: {uploaded_file.id})")
             return uploaded_file
@@ -27,26 +94,157 @@ class OpenAIClient:
             logging.error(f"Error uploading file to OpenAI: {e}")
             return None
 
-    def process_request(self, message: str, images: List[Dict[str, Any]]) -> ChatCompletion:
-        """Process a request with OpenAI API."""
-        openai_messages = [{
+    def process_request(self, message: str, images: List[Dict[str, Any]],
+                        history: Optional[List[Dict[str, Any]]] = None,
+                        model: Optional[str] = None, max_tokens: int = 2048) -> ChatCompletion:
+        """Process a request with the routed model backend, optionally following earlier turns."""
+        openai_messages = (history or []) + [{
             "role": "user",
             "content": [{"type": "text", "text": message}] + images
         }]
 
+        alias, route = self.router.resolve(message, model)
+        backend = self.backends[route.backend]
+
+        logging.info(f"Routing request to {route.backend}:{route.model} ({alias})")
+        self.metrics.increment(f"model_{alias}")
+        return self._call_with_retries(
+            lambda: backend.complete(route.model, openai_messages, max_tokens),
+            route.backend
+        )
+
+    def _call_with_retries(self, call: Callable[[], Any], backend: str = 'openai') -> Any:
+        """Run an API call in a concurrency slot, behind the backend's circuit breaker."""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=openai_messages,
-                response_format={"type": "text"},
-                temperature=1,
-                max_tokens=2048,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0
-            )
-            return response
-            
-        except Exception as e:
-            logging.error(f"Error processing request: {e}")
-            raise 
\ No newline at end of file
+            with self.concurrency.slot():
+                return self._call_with_breaker(call, backend)
+        except OverloadedError:
+            self.metrics.increment("overloaded")
+            raise
+
+    def _call_with_breaker(self, call: Callable[[], Any], backend: str) -> Any:
+        """Retry 429/5xx with jittered backoff while the circuit breaker allows it."""
+        breaker = self.breakers[backend]
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.increment("rejected")
+            raise
+
+        self.metrics.increment("requests")
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                response = call()
+                breaker.record_success()
+                self.metrics.increment("successes")
+                return response
+
+            except (APIConnectionError, APIStatusError) as e:
+                if isinstance(e.__cause__, httpx.PoolTimeout):
+                    # Every pooled connection was busy: local backpressure, not an upstream failure
+                    breaker.release()
+                    self.metrics.increment("pool_timeouts")
+                    logging.warning(f"No free connection to {backend} within the pool timeout")
+                    raise OverloadedError(self.retry_base_delay) from e
+
+                # APITimeoutError is an APIConnectionError
+                status = getattr(e, 'status_code', None)
+                retryable = isinstance(e, APIConnectionError) or status in RETRYABLE_STATUS_CODES
+                if not retryable:
+                    # The upstream answered, so it is healthy even though the request was bad
+                    breaker.record_success()
+                    self.metrics.increment("client_errors")
+                    logging.error(f"Error processing request: {e}")
+                    raise
+                if attempt == self.max_retries:
+                    breaker.record_failure()
+                    self.metrics.increment("failures")
+                    logging.error(f"Error processing request after {attempt + 1} attempts: {e}")
+                    raise
+
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                retry_after = self._retry_after(e)
+                if retry_after is not None:
+                    delay = min(max(delay, retry_after), self.retry_max_delay)
+                if isinstance(e, APITimeoutError):
+                    self.metrics.increment("timeouts")
+                else:
+                    self.metrics.increment(f"status_{status or 'connection'}")
+                self.metrics.increment("retries")
+                logging.warning(f"OpenAI request failed ({status or type(e).__name__}), "
+                                f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+            except Exception as e:
+                breaker.record_failure()
+                self.metrics.increment("failures")
+                logging.error(f"Error processing request: {e}")
+                raise
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        """Seconds requested by a Retry-After header, if the error carries one."""
+        response = getattr(error, 'response', None)
+        try:
+            return float(response.headers.get('retry-after')) if response is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Request counters and the circuit breaker state."""
+        return {
+            'backends': {name: {'circuit_state': breaker.state} for name, breaker in self.breakers.items()},
+            'routing': self.router.routing,
+            'in_flight': self.concurrency.in_flight,
+            **self.metrics.snapshot()
+        }
+
+    def process_requests(
+        self, jobs: List[Tuple[str, List[Dict[str, Any]], Optional[str]]]
+    ) -> List[Union[ChatCompletion, Exception]]:
+        """Process several (message, images, model) requests concurrently.
+
+        Results are returned in the same order as the jobs. A failed request
+        yields its exception instead of aborting the whole batch.
+        """
+        futures = [self.executor.submit(self.process_request, message, images, None, model)
+                   for message, images, model in jobs]
+
+        results: List[Union[ChatCompletion, Exception]] = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def create_batch(self, input_file_id: str) -> Any:
+        """Create a Batch API job for an uploaded JSONL file."""
+        client = self._require_openai()
+        batch = self._call_with_retries(lambda: client.batches.create(
+            input_file_id=input_file_id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        ))
+        logging.info(f"Batch created: {batch.id} (input file: {input_file_id})")
+        return batch
+
+    def get_batch(self, batch_id: str) -> Any:
+        """Retrieve the current state of a Batch API job."""
+        client = self._require_openai()
+        return self._call_with_retries(lambda: client.batches.retrieve(batch_id))
+
+    def embed(self, texts: List[str], model: str = "text-embedding-3-small",
+              dimensions: Optional[int] = None) -> List[List[float]]:
+        """Embed texts with the OpenAI embeddings API."""
+        client = self._require_openai()
+        kwargs = {'dimensions': dimensions} if dimensions else {}
+        result = self._call_with_retries(lambda: client.embeddings.create(model=model, input=texts, **kwargs))
+        return [item.embedding for item in result.data]
+
+    def iter_file_lines(self, file_id: str) -> Iterator[str]:
+        """Stream the lines of a file stored on OpenAI without downloading it all first."""
+        with self._require_openai().files.with_streaming_response.content(file_id) as response:
+            for line in response.iter_lines():
+                if line:
+                    yield line
@@ -0,0 +1,125 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from flask import jsonify, request
+from pymongo import ReturnDocument
+
+from utils.db import MongoDB
+
+# Requests per minute and burst size per route; override with RATE_LIMITS (JSON)
+DEFAULT_RATE_LIMITS = {
+    'capture': {'per_minute': 60, 'burst': 10},
+    'send_request': {'per_minute': 10, 'burst': 5},
+    'send_batch_request': {'per_minute': 2, 'burst': 2},
+    'ingest_video': {'per_minute': 2, 'burst': 2},
+}
+# The in-memory store drops full buckets once it tracks this many keys
+MAX_TRACKED_BUCKETS = 10000
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # key -> (tokens, updated, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    def take(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        """Take one token; return whether it was available and the tokens left."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > MAX_TRACKED_BUCKETS:
+                # A full bucket behaves exactly like a missing one
+                self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        return allowed, tokens
+
+
+class MongoBucketStore:
+    """Token buckets in MongoDB, shared by every worker process.
+
+    Refill and take happen in one pipeline update, so concurrent workers never
+    spend the same token. Idle buckets expire through a TTL index.
+    """
+
+    def __init__(self, db: MongoDB) -> None:
+        self.buckets = db.db.rate_limits
+        self.buckets.create_index("expires_at", expireAfterSeconds=0)
+
+    def take(self, key: str, rate: float, capacity: float) -> Tuple[bool, float]:
+        """Take one token; return whether it was available and the tokens left."""
+        now = time.time()
+        try:
+            elapsed = {'$max': [0, {'$subtract': [now, {'$ifNull': ['$updated', now]}]}]}
+            bucket = self.buckets.find_one_and_update(
+                {'_id': key},
+                [
+                    {'$set': {
+                        'tokens': {'$min': [capacity, {'$add': [{'$ifNull': ['$tokens', capacity]},
+                                                                {'$multiply': [elapsed, rate]}]}]},
+                        'updated': now,
+                        # TTL indexes compare against UTC
+                        'expires_at': datetime.now(timezone.utc) + timedelta(seconds=capacity / rate)
+                    }},
+                    {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+                    {'$set': {'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']}}}
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return bucket['allowed'], bucket['tokens']
+        except Exception as e:
+            # Fail open: a database hiccup should not take the API down with it
+            logging.error(f"Error updating rate limit bucket {key}: {e}")
+            return True, capacity
+
+
+class RateLimiter:
+    """Per-client, per-route token buckets.
+
+    Clients are identified by remote address. RATE_LIMIT_STORE selects `memory`
+    (per process, the default) or `mongo` (shared across workers).
+    """
+
+    def __init__(self, db: Optional[MongoDB] = None) -> None:
+        limits = {**DEFAULT_RATE_LIMITS, **json.loads(os.getenv("RATE_LIMITS", "{}"))}
+        self.limits = {route: limit for route, limit in limits.items() if limit.get('per_minute')}
+        store = os.getenv("RATE_LIMIT_STORE", "memory")
+        self.store = MongoBucketStore(db or MongoDB()) if store == 'mongo' else MemoryBucketStore()
+
+    def check(self, route: str, client: str) -> Optional[float]:
+        """Spend a token for the client on the route; return seconds to wait if none is left."""
+        limit = self.limits.get(route)
+        if limit is None:
+            return None
+        rate = limit['per_minute'] / 60.0
+        allowed, tokens = self.store.take(f"{route}:{client}", rate, float(limit.get('burst', 1)))
+        return None if allowed else (1 - tokens) / rate
+
+    def limit(self, route: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorate a view so requests over the route's limit get a 429 with Retry-After."""
+        def decorator(view: Callable[..., Any]) -> Callable[..., Any]:
+            @wraps(view)
+            def limited(*args: Any, **kwargs: Any) -> Any:
+                client = request.remote_addr or 'unknown'
+                retry_after = self.check(route, client)
+                if retry_after is not None:
+                    logging.warning(f"Rate limited {client} on {route}")
+                    retry_header = {'Retry-After': str(math.ceil(retry_after))}
+                    return jsonify({"error": "Rate limit exceeded"}), 429, retry_header
+                return view(*args, **kwargs)
+            return limited
+        return decorator
@@ -0,0 +1,152 @@
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Upstream unavailable, retry in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    """Raised when no upstream call slot frees up within the queue timeout."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Too many requests in flight, retry in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+class Metrics:
+    """Thread-safe event counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures.
+
+    Closed: calls pass through. After `failure_threshold` consecutive failures
+    the breaker opens and rejects calls for `reset_timeout` seconds, then lets a
+    single trial call through (half-open). A success closes it again; a failure
+    reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 on_transition: Optional[Callable[[str, str], None]] = None) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_transition = on_transition
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        logging.warning(f"Circuit breaker {previous} -> {state}")
+        if self.on_transition:
+            self.on_transition(previous, state)
+
+    def before_call(self) -> None:
+        """Reserve permission for a call or raise CircuitOpenError."""
+        with self._lock:
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self._transition(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(self.reset_timeout)
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def release(self) -> None:
+        """Give back a reserved call that never reached the upstream, without judging its health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED
+                                                 and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent upstream calls.
+
+    Callers wait up to `queue_timeout` seconds for a free slot and are then
+    rejected with OverloadedError. The suggested retry delay is a moving
+    average of how long calls hold a slot.
+    """
+
+    def __init__(self, max_in_flight: int, queue_timeout: float) -> None:
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._average_duration = 1.0
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                raise OverloadedError(max(self._average_duration, 1.0))
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._average_duration = 0.8 * self._average_duration + 0.2 * (time.monotonic() - started)
+            self._slots.release()
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
@@ -0,0 +1,59 @@
+import io
+import logging
+from typing import Dict, Any, List, Optional
+
+from PIL import Image
+
+# Supported capture sampling strategies
+STRATEGIES = ('every_nth', 'diverse')
+
+
+def perceptual_hash(image_data: bytes, hash_size: int = 8) -> Optional[str]:
+    """Compute a difference hash (dHash) of an image as a hex string."""
+    try:
+        image = Image.open(io.BytesIO(image_data)).convert('L').resize((hash_size + 1, hash_size))
+        pixels = list(image.getdata())
+        bits = 0
+        for row in range(hash_size):
+            for col in range(hash_size):
+                left = pixels[row * (hash_size + 1) + col]
+                right = pixels[row * (hash_size + 1) + col + 1]
+                bits = (bits << 1) | (left > right)
+        return f"{bits:0{hash_size * hash_size // 4}x}"
+    except Exception as e:
+        logging.error(f"Error computing perceptual hash: {e}")
+        return None
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Number of differing bits between two hex hashes."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def every_nth(captures: List[Dict[str, Any]], step: int) -> List[Dict[str, Any]]:
+    """Keep every Nth capture, starting from the first."""
+    return captures[::max(step, 1)]
+
+
+def most_diverse(captures: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """Greedily pick the K captures whose perceptual hashes are furthest apart.
+
+    Starts from the first capture and repeatedly adds the candidate with the
+    largest distance to its nearest already-selected capture. Captures without
+    a `phash` are ignored.
+    """
+    candidates = [capture for capture in captures if capture.get('phash')]
+    if len(candidates) <= k:
+        return candidates
+
+    selected = [candidates[0]]
+    # Distance from each candidate to its nearest selected capture
+    nearest = [hamming_distance(c['phash'], selected[0]['phash']) for c in candidates]
+    while len(selected) < k:
+        best = max(range(len(candidates)), key=lambda i: nearest[i])
+        if nearest[best] == 0:
+            break  # Everything left is a duplicate of something selected
+        selected.append(candidates[best])
+        for i, candidate in enumerate(candidates):
+            nearest[i] = min(nearest[i], hamming_distance(candidate['phash'], candidates[best]['phash']))
+    return selected
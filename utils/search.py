@@ -0,0 +1,356 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.db import MongoDB
+from utils.conversation import response_content
+from utils.events import on_write
+from utils.openai_client import OpenAIClient
+
+EmbeddingFunction = Callable[[List[str]], np.ndarray]
+
+EMBEDDING_DIM = 256
+SYNC_BATCH_SIZE = 500
+# Seconds between background index syncs when no response writes are seen
+SYNC_INTERVAL = float(os.getenv("SEARCH_SYNC_INTERVAL", "30"))
+# One process embeds and saves the index at a time; the others reload it from disk.
+# A syncing process that stops renewing its lease for this long is replaced.
+SYNC_LEASE_SECONDS = float(os.getenv("SEARCH_SYNC_LEASE", str(max(120.0, 3 * SYNC_INTERVAL))))
+
+# Fields needed to render a search hit, leaving out the raw response payload
+SEARCH_RESULT_PROJECTION = {
+    'timestamp': 1,
+    'message': 1,
+    'conversation_id': 1,
+    'capture_ids': 1,
+    'content': 1
+}
+
+
+def response_text(response: Dict[str, Any]) -> str:
+    """The searchable text of a response: the question and the assistant reply."""
+    return f"{response.get('message', '')}\n{response_content(response)}".strip()
+
+
+def hashing_embedding(texts: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Deterministic local embedding: hashed bag of words and word bigrams.
+
+    Needs no network or model download, which makes it suitable for offline
+    use and tests. Vectors are L2-normalized.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = re.findall(r"\w+", text.lower())
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % dim
+            vectors[row, index] += 1.0 if digest[4] & 1 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def openai_embedding(openai_client: OpenAIClient, texts: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Embed texts with the OpenAI embeddings API, behind the client's breaker and limits."""
+    vectors = np.array(openai_client.embed(texts, dimensions=dim), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+EMBEDDERS = ('hashing', 'openai')
+
+
+class VectorIndex:
+    """Brute-force cosine similarity index over normalized vectors, persisted to disk.
+
+    Every index gets a random `generation` when it is first created. Responses
+    are marked with the generation that embedded them, so a lost or rebuilt
+    index re-embeds everything. Vectors live in a buffer that grows by
+    doubling, so appending a batch does not copy the whole index.
+    """
+
+    def __init__(self, index_dir: Path) -> None:
+        self.index_dir = Path(index_dir)
+        self.lock = threading.Lock()
+        self.generation = uuid.uuid4().hex
+        self.ids: List[str] = []
+        self.vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._buffer = self.vectors
+        self._positions: Dict[str, int] = {}
+        self._loaded_mtime: Optional[int] = None
+        self._load()
+
+    def _meta_mtime(self) -> Optional[int]:
+        try:
+            return (self.index_dir / 'meta.json').stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> None:
+        ids_path = self.index_dir / 'ids.json'
+        vectors_path = self.index_dir / 'vectors.npy'
+        meta_path = self.index_dir / 'meta.json'
+        if not (ids_path.exists() and vectors_path.exists() and meta_path.exists()):
+            return
+        # Read before loading: a save that lands mid-load changes it, and the next reload catches up
+        mtime = self._meta_mtime()
+        try:
+            with open(ids_path) as f:
+                ids = json.load(f)
+            with open(meta_path) as f:
+                generation = json.load(f)['generation']
+            vectors = np.load(vectors_path)
+            if len(ids) != len(vectors):
+                raise ValueError("ids and vectors are out of step")
+            with self.lock:
+                self.ids, self.vectors, self.generation = ids, vectors, generation
+                self._buffer = vectors
+                self._positions = {id: i for i, id in enumerate(ids)}
+            self._loaded_mtime = mtime
+            logging.info(f"Loaded vector index with {len(ids)} responses from {self.index_dir}")
+        except Exception as e:
+            logging.error(f"Error loading vector index, rebuilding: {e}")
+
+    def reload(self, force: bool = False) -> None:
+        """Load the index from disk if another process saved it since it was last loaded."""
+        mtime = self._meta_mtime()
+        if mtime is not None and (force or mtime != self._loaded_mtime):
+            self._load()
+
+    def save(self) -> None:
+        """Persist the index, replacing the previous files atomically."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            ids, vectors = list(self.ids), self.vectors
+        np.save(self.index_dir / 'vectors.tmp.npy', vectors)
+        with open(self.index_dir / 'ids.tmp.json', 'w') as f:
+            json.dump(ids, f)
+        with open(self.index_dir / 'meta.tmp.json', 'w') as f:
+            json.dump({'generation': self.generation}, f)
+        os.replace(self.index_dir / 'vectors.tmp.npy', self.index_dir / 'vectors.npy')
+        os.replace(self.index_dir / 'ids.tmp.json', self.index_dir / 'ids.json')
+        os.replace(self.index_dir / 'meta.tmp.json', self.index_dir / 'meta.json')
+        self._loaded_mtime = self._meta_mtime()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._positions
+
+    def add(self, ids: List[str], vectors: np.ndarray) -> None:
+        """Append vectors, replacing ids already present."""
+        with self.lock:
+            vectors = vectors.astype(np.float32)
+            new = []
+            for row, id in enumerate(ids):
+                if id in self._positions:
+                    self.vectors[self._positions[id]] = vectors[row]
+                else:
+                    self._positions[id] = len(self.ids)
+                    self.ids.append(id)
+                    new.append(row)
+            if not new:
+                return
+            start, count = len(self.vectors), len(self.ids)
+            if count > len(self._buffer):
+                grown = np.zeros((max(count, 2 * len(self._buffer)), self._buffer.shape[1]), dtype=np.float32)
+                grown[:start] = self.vectors
+                self._buffer = grown
+            # Queries hold on to the previous view, which never covers the rows written here
+            self._buffer[start:count] = vectors[new]
+            self.vectors = self._buffer[:count]
+
+    def remove(self, ids: List[str]) -> int:
+        """Drop entries by id; returns how many were present."""
+        with self.lock:
+            drop = {self._positions[id] for id in ids if id in self._positions}
+            if not drop:
+                return 0
+            keep = [i for i in range(len(self.ids)) if i not in drop]
+            self.ids = [self.ids[i] for i in keep]
+            self.vectors = self._buffer = self.vectors[keep]
+            self._positions = {id: i for i, id in enumerate(self.ids)}
+            return len(drop)
+
+    def query(self, vector: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        """Return the `limit` most similar entries as (id, score), best first."""
+        with self.lock:
+            ids, vectors = self.ids, self.vectors
+        if not ids or limit <= 0:
+            return []
+        scores = vectors @ vector
+        limit = min(limit, len(ids))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+
+class ResponseSearch:
+    """Keyword search through the Mongo text index and semantic search through a VectorIndex.
+
+    The vector index is kept up to date by a background thread. It picks up
+    responses that are not marked with the index generation, whatever their
+    `_id`, so imported older responses are indexed too. Across worker processes
+    (and the reloader's parent) only the holder of a lease in `search_sync`
+    embeds and saves; the others reload the saved index. Deletes are queued in
+    `search_removals` and applied by the syncing process.
+    """
+
+    def __init__(self, db: MongoDB, openai_client: Optional[OpenAIClient] = None,
+                 index_dir: Optional[Path] = None, embed: Optional[EmbeddingFunction] = None) -> None:
+        self.db = db
+        self.index = VectorIndex(index_dir or Path(os.getenv("SEARCH_INDEX_DIR", "./search_index")))
+        if embed is None:
+            embedder = os.getenv("SEARCH_EMBEDDER", "hashing")
+            if embedder not in EMBEDDERS:
+                raise ValueError(f"SEARCH_EMBEDDER must be one of {', '.join(EMBEDDERS)}")
+            embed = (partial(openai_embedding, openai_client or OpenAIClient())
+                     if embedder == 'openai' else hashing_embedding)
+        self.embed = embed
+        self.db.responses.create_index("search_index")
+        self.owner = uuid.uuid4().hex
+        self._sync_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background sync thread, woken early by response writes and deletes."""
+        if self._thread is None:
+            on_write(lambda collection: self._dirty.set() if collection == 'responses' else None)
+            self._thread = threading.Thread(target=self._run, name="search-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                logging.error(f"Error syncing search index: {e}")
+            self._dirty.wait(SYNC_INTERVAL)
+            self._dirty.clear()
+
+    def _claim(self) -> bool:
+        """Take or renew the sync lease; False while another live process holds it."""
+        now = datetime.now()
+        stale = now - timedelta(seconds=SYNC_LEASE_SECONDS)
+        try:
+            return self.db.db.search_sync.find_one_and_update(
+                {'_id': 'sync', '$or': [{'owner': self.owner}, {'heartbeat_at': {'$lt': stale}}]},
+                {'$set': {'owner': self.owner, 'heartbeat_at': now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            ) is not None
+        except DuplicateKeyError:
+            return False
+
+    def sync(self) -> int:
+        """Embed responses not yet in this index generation and apply queued removals.
+
+        The index is saved once per pass and responses are marked only after
+        that, so a crash at worst re-embeds them. Without the lease this only
+        reloads the index another process saved.
+        """
+        with self._sync_lock:
+            self.index.reload()
+            if not self._claim():
+                return 0
+
+            indexed: List[ObjectId] = []
+            batch: List[Dict[str, Any]] = []
+            cursor = self.db.responses.find(
+                {'search_index': {'$ne': self.index.generation}}, {'message': 1, 'content': 1}
+            ).batch_size(SYNC_BATCH_SIZE)
+            for response in cursor:
+                batch.append(response)
+                if len(batch) >= SYNC_BATCH_SIZE:
+                    indexed += self._embed_batch(batch)
+                    batch = []
+                    if not self._claim():
+                        return self._abandon()
+            if batch:
+                indexed += self._embed_batch(batch)
+
+            removals = [doc['_id'] for doc in self.db.db.search_removals.find({}, {'_id': 1})]
+            removed = self.index.remove(removals) if removals else 0
+            if indexed or removed:
+                if not self._claim():
+                    return self._abandon()
+                self.index.save()
+            for start in range(0, len(indexed), SYNC_BATCH_SIZE):
+                self.db.responses.update_many({'_id': {'$in': indexed[start:start + SYNC_BATCH_SIZE]}},
+                                              {'$set': {'search_index': self.index.generation}})
+            if removals:
+                self.db.db.search_removals.delete_many({'_id': {'$in': removals}})
+
+            if indexed or removed:
+                logging.info(f"Indexed {len(indexed)} new responses for search, removed {removed}")
+            return len(indexed)
+
+    def _embed_batch(self, responses: List[Dict[str, Any]]) -> List[ObjectId]:
+        self.index.add([str(response['_id']) for response in responses],
+                       self.embed([response_text(response) for response in responses]))
+        return [response['_id'] for response in responses]
+
+    def _abandon(self) -> int:
+        """Drop unsaved work after losing the lease mid-pass."""
+        logging.warning("Lost the search sync lease, reloading the index saved by its new holder")
+        self.index.reload(force=True)
+        return 0
+
+    def remove(self, response_id: str) -> None:
+        """Queue a deleted response for removal from the vector index by the syncing process."""
+        self.db.db.search_removals.update_one({'_id': response_id},
+                                              {'$set': {'queued_at': datetime.now()}}, upsert=True)
+        self._dirty.set()
+
+    def keyword(self, text: str, page: int = 1, per_page: int = 20) -> Dict[str, Any]:
+        """Keyword search ranked by Mongo text score."""
+        query = {'$text': {'$search': text}}
+        projection = {'score': {'$meta': 'textScore'}, **SEARCH_RESULT_PROJECTION}
+        responses = list(self.db.responses.find(query, projection)
+                         .sort([('score', {'$meta': 'textScore'})])
+                         .skip((page - 1) * per_page).limit(per_page))
+        return {
+            'total': self.db.responses.count_documents(query),
+            'results': [self._format(response, response['score']) for response in responses]
+        }
+
+    def semantic(self, text: str, page: int = 1, per_page: int = 20) -> Dict[str, Any]:
+        """Semantic search ranked by embedding cosine similarity.
+
+        Responses saved in the last few seconds may not be indexed yet.
+        """
+        ranked = self.index.query(self.embed([text])[0], page * per_page)[(page - 1) * per_page:]
+        scores = dict(ranked)
+        found = {str(response['_id']): response for response in self.db.responses.find(
+            {'_id': {'$in': [ObjectId(id) for id, _ in ranked]}}, SEARCH_RESULT_PROJECTION)}
+        return {
+            'total': len(self.index),
+            # Responses deleted by another process since they were indexed simply drop out
+            'results': [self._format(found[id], scores[id]) for id, _ in ranked if id in found]
+        }
+
+    def _format(self, response: Dict[str, Any], score: float) -> Dict[str, Any]:
+        return {
+            '_id': str(response['_id']),
+            'timestamp': response['timestamp'],
+            'message': response.get('message', ''),
+            'content': response_content(response),
+            'conversation_id': response.get('conversation_id'),
+            'capture_ids': [str(id) for id in response.get('capture_ids', [])],
+            'score': score
+        }
+
@@ -0,0 +1,103 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+
+class StatsCache:
+    """Serves expensive statistics from memory, refreshed by a single background thread.
+
+    The thread recomputes every `interval` seconds, or sooner after a write
+    event (but never more often than `min_interval`), so the cost no longer
+    depends on how many clients are polling.
+    """
+
+    def __init__(self, compute: Dict[str, Callable[[], Dict[str, Any]]],
+                 interval: Optional[float] = None, min_interval: Optional[float] = None) -> None:
+        self.compute = compute
+        self.interval = interval or float(os.getenv("STATS_REFRESH_INTERVAL", "30"))
+        self.min_interval = min_interval or float(os.getenv("STATS_MIN_REFRESH_INTERVAL", "2"))
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._values: Dict[str, Dict[str, Any]] = {}
+        self._generated_at: Dict[str, datetime] = {}
+        self._errors: Dict[str, str] = {}
+        # Monotonic start time of the last completed refresh
+        self._last_refresh: Optional[float] = None
+        self._dirty = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background refresh thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stats-cache", daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, collection: str = '') -> None:
+        """Request a refresh because the underlying data changed."""
+        self._dirty.set()
+
+    def refresh(self, requested_at: Optional[float] = None) -> None:
+        """Recompute every statistic now.
+
+        Callers on a request pass the monotonic time the request arrived; the
+        work is skipped if a refresh started after that, or less than
+        `min_interval` ago, so concurrent forced refreshes share one run.
+        A statistic whose computation fails keeps its last good value.
+        """
+        with self._refresh_lock:
+            if requested_at is not None and self._last_refresh is not None and (
+                    self._last_refresh >= requested_at
+                    or time.monotonic() - self._last_refresh < self.min_interval):
+                return
+            started = time.monotonic()
+            values, errors = {}, {}
+            for name, compute in self.compute.items():
+                try:
+                    values[name] = compute()
+                except Exception as e:
+                    logging.error(f"Error computing {name} stats: {e}")
+                    errors[name] = str(e)
+            now = datetime.now()
+            with self._lock:
+                self._values.update(values)
+                self._generated_at.update({name: now for name in values})
+                self._errors = errors
+                self._last_refresh = started
+            logging.debug(f"Refreshed stats cache in {time.monotonic() - started:.3f}s")
+
+    def get(self, name: str, force: bool = False) -> Dict[str, Any]:
+        """Return cached statistics with their generation time and age.
+
+        Only the first request, before any refresh has completed, or a forced
+        one computes inline. If the last computation failed, the previous
+        value is served with the error in its `cache` object.
+        """
+        requested_at = time.monotonic()
+        with self._lock:
+            refreshed = self._last_refresh is not None
+        if force or not refreshed:
+            self.refresh(requested_at)
+
+        with self._lock:
+            generated_at = self._generated_at.get(name)
+            value = dict(self._values.get(name, {}))
+            error = self._errors.get(name)
+        value['cache'] = {
+            'generated_at': generated_at.isoformat() if generated_at else None,
+            'age_seconds': round((datetime.now() - generated_at).total_seconds(), 1) if generated_at else None,
+            'refresh_interval': self.interval
+        }
+        if error:
+            value['cache']['error'] = error
+        return value
+
+    def _run(self) -> None:
+        while True:
+            self.refresh()
+            # Coalesce bursts of writes into one refresh per min_interval
+            time.sleep(self.min_interval)
+            self._dirty.wait(max(self.interval - self.min_interval, 0))
+            self._dirty.clear()
@@ -0,0 +1,59 @@
+import io
+import os
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from PIL import Image
+
+# Variant name -> (longest edge in pixels, Pillow format, mimetype, quality)
+VARIANTS = {
+    'thumbnail': (256, 'WEBP', 'image/webp', 70),
+    'preview': (1024, 'JPEG', 'image/jpeg', 85),
+}
+
+
+def make_variant(image_data: bytes, size: str) -> Dict[str, Any]:
+    """Downscale an image into one of the configured variants."""
+    max_edge, image_format, mimetype, quality = VARIANTS[size]
+    image = Image.open(io.BytesIO(image_data))
+    image.thumbnail((max_edge, max_edge))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality)
+    return {
+        'data': base64.b64encode(output.getvalue()).decode('utf-8'),
+        'mimetype': mimetype,
+        'width': image.width,
+        'height': image.height
+    }
+
+
+def make_variants(image_data: bytes) -> Dict[str, Dict[str, Any]]:
+    """Build every configured variant for an image."""
+    return {size: make_variant(image_data, size) for size in VARIANTS}
+
+
+class ThumbnailGenerator:
+    """Generates capture variants on a background worker pool."""
+
+    def __init__(self, db: Any, max_workers: Optional[int] = None) -> None:
+        self.db = db
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("THUMBNAIL_WORKERS", "2")),
+            thread_name_prefix="thumbnails"
+        )
+
+    def submit(self, capture_id: str, image_data: bytes) -> None:
+        """Queue variant generation for a freshly saved capture."""
+        self.executor.submit(self._generate, capture_id, image_data)
+
+    def _generate(self, capture_id: str, image_data: bytes) -> None:
+        try:
+            if self.db.save_capture_variants(capture_id, make_variants(image_data)):
+                logging.info(f"Generated thumbnails for capture {capture_id}")
+        except Exception as e:
+            logging.error(f"Error generating thumbnails for capture {capture_id}: {e}")
@@ -0,0 +1,242 @@
+import os
+import uuid
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.db import MongoDB, capture_mimetype
+from utils.conversation import new_conversation_id
+from utils.sampling import perceptual_hash
+
+# Supported frame sampling modes
+VIDEO_MODES = ('interval', 'scene', 'keyframe')
+
+# Scene detection compares frames at this size and rate to keep decoding cheap
+SCENE_FRAME_SIZE = (64, 36)
+SCENE_CHECKS_PER_SECOND = 4
+
+# Streams have no end, so they are cut off after this long unless told otherwise
+DEFAULT_STREAM_SECONDS = int(os.getenv("VIDEO_STREAM_SECONDS", "60"))
+# Used when a stream does not report its frame rate
+FALLBACK_FPS = 30.0
+# Frames are kept as JPEG: a 1080p frame is a few hundred KB instead of several MB as PNG
+FRAME_JPEG_QUALITY = int(os.getenv("VIDEO_JPEG_QUALITY", "85"))
+# Finished jobs stay queryable for this long
+JOB_TTL = timedelta(seconds=int(os.getenv("VIDEO_JOB_TTL", "3600")))
+
+
+def _encode_jpeg(frame: np.ndarray) -> bytes:
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, FRAME_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Failed to encode frame")
+    return encoded.tobytes()
+
+
+def _scene_signature(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, SCENE_FRAME_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _open_packet_reader(source: str) -> cv2.VideoCapture:
+    """Open a second FFmpeg reader that returns undecoded packets, to read key frame flags cheaply."""
+    reader = cv2.VideoCapture(source, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not reader.isOpened():
+        raise ValueError(f"Key frame sampling needs the FFmpeg backend: {source}")
+    return reader
+
+
+def sample_frames(source: str, mode: str = 'interval', interval_seconds: float = 1.0,
+                  scene_threshold: float = 0.15, max_frames: int = 50,
+                  max_seconds: Optional[float] = None) -> Iterator[Tuple[int, float, bytes]]:
+    """Yield (frame_index, seconds_into_video, jpeg_bytes) for sampled frames.
+
+    Frames are pulled one at a time and frames that are not inspected are only
+    grabbed, never converted to images, so memory stays flat regardless of the
+    video length. `interval` keeps one frame every `interval_seconds`; `scene`
+    keeps a frame whenever it differs from the last kept frame by more than
+    `scene_threshold` (mean absolute difference, 0-1); `keyframe` keeps the
+    encoder's key frames, which usually fall on cuts.
+    """
+    if mode not in VIDEO_MODES:
+        raise ValueError(f"Unknown sampling mode: {mode}")
+    if max_seconds is None and '://' in source:
+        max_seconds = DEFAULT_STREAM_SECONDS
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise ValueError(f"Failed to open video source: {source}")
+    packets = _open_packet_reader(source) if mode == 'keyframe' else None
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or FALLBACK_FPS
+        if mode == 'interval':
+            step = max(int(round(fps * interval_seconds)), 1)
+        elif mode == 'scene':
+            step = max(int(round(fps / SCENE_CHECKS_PER_SECOND)), 1)
+        else:
+            step = 1
+        last_signature: Optional[np.ndarray] = None
+        frame_index = -1
+        kept = 0
+
+        while kept < max_frames:
+            frame_index += 1
+            frame_time = frame_index / fps
+            if max_seconds is not None and frame_time > max_seconds:
+                break
+            if not cap.grab():
+                break
+            if packets is not None:
+                if not packets.grab() or not packets.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    continue
+            elif frame_index % step:
+                continue
+
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+
+            if mode == 'scene':
+                signature = _scene_signature(frame)
+                if last_signature is not None:
+                    change = float(np.mean(np.abs(signature - last_signature))) / 255
+                    if change < scene_threshold:
+                        continue
+                last_signature = signature
+
+            kept += 1
+            yield frame_index, frame_time, _encode_jpeg(frame)
+    finally:
+        cap.release()
+        if packets is not None:
+            packets.release()
+
+
+class VideoIngestor:
+    """Decodes videos on a background worker pool and stores sampled frames as captures."""
+
+    def __init__(self, db: MongoDB, openai_client: Optional[Any] = None,
+                 thumbnails: Optional[Any] = None, max_workers: Optional[int] = None) -> None:
+        self.db = db
+        self.openai_client = openai_client
+        self.thumbnails = thumbnails
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("VIDEO_WORKERS", "1")),
+            thread_name_prefix="video"
+        )
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def submit(self, source: str, cleanup: bool = False, **options: Any) -> str:
+        """Queue a video for ingestion and return the job id."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_finished()
+            self.jobs[job_id] = {'job_id': job_id, 'status': 'queued', 'created_at': datetime.now()}
+        self.executor.submit(self._run_job, job_id, source, cleanup, options)
+        return job_id
+
+    def _evict_finished(self) -> None:
+        """Forget jobs that finished more than JOB_TTL ago. Callers hold the lock."""
+        cutoff = datetime.now() - JOB_TTL
+        self.jobs = {job_id: job for job_id, job in self.jobs.items()
+                     if not job.get('finished_at') or job['finished_at'] > cutoff}
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict_finished()
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            self.jobs[job_id].update(fields)
+
+    def _run_job(self, job_id: str, source: str, cleanup: bool, options: Dict[str, Any]) -> None:
+        self._update(job_id, status='running')
+        try:
+            result = self.ingest(source, video_id=job_id,
+                                 on_saved=lambda **fields: self._update(job_id, **fields), **options)
+            self._update(job_id, status='completed', finished_at=datetime.now(), **result)
+        except Exception as e:
+            logging.error(f"Error ingesting video {source}: {e}")
+            self._update(job_id, status='failed', finished_at=datetime.now(), error=str(e))
+        finally:
+            if cleanup and os.path.exists(source):
+                os.remove(source)
+
+    def ingest(self, source: str, video_id: Optional[str] = None, name: Optional[str] = None,
+               mode: str = 'interval', interval_seconds: float = 1.0, scene_threshold: float = 0.15,
+               max_frames: int = 50, max_seconds: Optional[float] = None,
+               message: Optional[str] = None, send_limit: int = 5,
+               model: Optional[str] = None,
+               on_saved: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Sample a video into linked captures and optionally ask the model about them.
+
+        `on_saved` is called with the video and capture ids as soon as the
+        frames are stored. A failed model call does not undo the ingest; it is
+        reported as `analysis_error` in the result.
+        """
+        video_id = video_id or uuid.uuid4().hex
+        started = datetime.now()
+        captures = []
+        for frame_index, frame_time, image_data in sample_frames(
+                source, mode, interval_seconds, scene_threshold, max_frames, max_seconds):
+            captures.append({
+                'timestamp': started + timedelta(seconds=frame_time),
+                'image_data': base64.b64encode(image_data).decode('utf-8'),
+                'file_type': 'jpeg',
+                'source': f"video:{name or os.path.basename(source) or source}",
+                'phash': perceptual_hash(image_data),
+                'video_id': video_id,
+                'frame_index': frame_index,
+                'frame_time': round(frame_time, 3),
+                'archived': False
+            })
+
+        capture_ids = self.db.save_captures(captures)
+        if captures and not capture_ids:
+            raise RuntimeError("Failed to save sampled frames to database")
+        logging.info(f"Ingested {len(capture_ids)} frames from {source} as video {video_id}")
+        if self.thumbnails:
+            for capture_id, capture in zip(capture_ids, captures):
+                self.thumbnails.submit(capture_id, base64.b64decode(capture['image_data']))
+
+        result: Dict[str, Any] = {'video_id': video_id, 'capture_ids': capture_ids}
+        if on_saved:
+            on_saved(**result)
+        if message and capture_ids and self.openai_client:
+            try:
+                result['response_id'] = self._analyze(message, capture_ids, captures, send_limit, model)
+            except Exception as e:
+                logging.error(f"Error analyzing video {video_id}: {e}")
+                result['analysis_error'] = str(e)
+        return result
+
+    def _analyze(self, message: str, capture_ids: List[str], captures: List[Dict[str, Any]],
+                 send_limit: int, model: Optional[str]) -> Optional[str]:
+        """Send an evenly spaced subset of the sampled frames to the model."""
+        stride = max(len(captures) / send_limit, 1)
+        picked = sorted({int(i * stride) for i in range(min(send_limit, len(captures)))})
+        images = [{
+            "type": "image_url",
+            "image_url": {"url": f"data:{capture_mimetype(captures[i])};base64,{captures[i]['image_data']}"}
+        } for i in picked]
+        sent_ids = [capture_ids[i] for i in picked]
+
+        response = self.openai_client.process_request(message, images, model=model)
+        response_id = self.db.save_response({
+            'message': message,
+            'response_data': response.model_dump() if hasattr(response, 'model_dump') else response,
+            'capture_ids': sent_ids,
+            'conversation_id': new_conversation_id(),
+            'timestamp': datetime.now()
+        })
+        self.db.archive_captures(sent_ids)
+        return response_id